@@ -40,12 +40,28 @@ class BulkImportCSVCommand(ImportCSVCommandMixin, BulkCSVImporter, BaseCommand):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.bar = None
+        self.bar_read_bytes = 0
 
     def _pre_import_rows(self, row_count):
-        self.bar = pyprind.ProgBar(row_count, stream=ProgressBarStream(self.stdout))
+        if row_count is not None:
+            self.bar = pyprind.ProgBar(row_count, stream=ProgressBarStream(self.stdout))
+        elif self.progress_stream.total_bytes:
+            # Streamed file progress is measured in bytes
+            self.bar = pyprind.ProgBar(self.progress_stream.total_bytes, stream=ProgressBarStream(self.stdout))
+            self.bar_read_bytes = 0
+        else:
+            self.bar = None
 
     def _post_batch_create(self, created_count, row_count):
-        self.bar.update(iterations=created_count)
+        if self.bar is None:
+            return
+        elif row_count is not None:
+            self.bar.update(iterations=created_count)
+        else:
+            read_bytes = min(self.progress_stream.read_bytes, self.progress_stream.total_bytes)
+            if read_bytes > self.bar_read_bytes:
+                self.bar.update(iterations=read_bytes - self.bar_read_bytes)
+                self.bar_read_bytes = read_bytes
 
     def _post_import_rows(self, created_count, updated_count=0):
         self.stdout.write('\nCreated {created} {model_name}.'.format(
@@ -15,6 +15,7 @@ DEFAULTS = {
         'is_cleaned_post_delete': False,
         'is_save_atomic': False,
         'is_delete_atomic': False,
+        'changed_fields_snapshot_strategy': 'copy',
     }
 }
 
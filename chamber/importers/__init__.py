@@ -1,7 +1,28 @@
 import csv
 import io
-
+import logging
+import mmap
+import multiprocessing
+import os
+import stat
+
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import reduce
 from itertools import zip_longest
+from operator import or_
+
+from django.core.exceptions import MultipleObjectsReturned
+from django.db import connections, models, transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+COUNT_BLOCK_SIZE = 16 * 1024 * 1024
+# Maximal number of rows whose existing objects are found with one query (SQLite limits depth of OR expressions)
+EXISTING_OBJECTS_QUERY_SIZE = 500
 
 
 def simple_count(file):
@@ -11,6 +32,257 @@ def simple_count(file):
     return lines
 
 
+def simple_csv_count(file, delimiter=',', quotechar='"'):
+    rows = 0
+    for _ in csv.reader(file, delimiter=delimiter, quotechar=quotechar):
+        rows += 1
+    return rows
+
+
+def _get_raw_file(file):
+    """
+    Returns the plain file (FileIO) underlying the stream or None for compressed or network streams which must
+    be decoded.
+    """
+    raw = file
+    if isinstance(raw, io.TextIOWrapper):
+        raw = raw.buffer
+    if isinstance(raw, io.BufferedIOBase):
+        raw = getattr(raw, 'raw', None)
+    return raw if isinstance(raw, io.FileIO) else None
+
+
+def _is_ascii_compatible(encoding, quotechar='"'):
+    """
+    Returns True if newline and quote bytes are decoded to the same characters, therefore the file can be processed
+    on the byte level.
+    """
+    try:
+        return (b'\n' + quotechar.encode('ascii')).decode(encoding) == '\n' + quotechar
+    except (LookupError, UnicodeError):
+        return False
+
+
+def _get_countable_fileno(file, quotechar):
+    """
+    Returns descriptor of the plain file underlying the stream if the stream is at the beginning of the file
+    and newlines and quotes can be counted on the byte level, None otherwise.
+    """
+    raw = _get_raw_file(file)
+    if raw is None or not _is_ascii_compatible(getattr(file, 'encoding', 'ascii'), quotechar):
+        return None
+
+    try:
+        return raw.fileno() if file.tell() == 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def _count_newlines(data, quote=None):
+    """
+    Returns number of newlines in the memory mapped file. If `quote` is set, newlines in the quoted values are not
+    counted.
+    """
+    newlines = 0
+    is_quoted = False
+    for offset in range(0, len(data), COUNT_BLOCK_SIZE):
+        block = data[offset:offset + COUNT_BLOCK_SIZE]
+        if quote is None or (not is_quoted and quote not in block):
+            newlines += block.count(b'\n')
+        else:
+            for i, part in enumerate(block.split(quote)):
+                if i > 0:
+                    is_quoted = not is_quoted
+                if not is_quoted:
+                    newlines += part.count(b'\n')
+    return newlines
+
+
+def fast_count(file, exact=False, delimiter=',', quotechar='"'):
+    """
+    Returns number of lines of the file. Plain files are counted by the newlines in large blocks of the memory
+    mapped file (lines must be terminated with "\\n" or "\\r\\n"), other streams (text, compressed, non-seekable)
+    are counted with the `simple_count`.
+    If `exact` is set, newlines inside the quoted CSV values (values must be quoted as a whole) are not counted,
+    therefore the result is number of the CSV rows.
+    """
+    fileno = _get_countable_fileno(file, quotechar)
+    if fileno is None:
+        return simple_csv_count(file, delimiter=delimiter, quotechar=quotechar) if exact else simple_count(file)
+
+    if os.fstat(fileno).st_size == 0:
+        return 0
+    with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as data:
+        newlines = _count_newlines(data, quote=quotechar.encode('ascii') if exact else None)
+        return newlines if data[-1:] == b'\n' else newlines + 1
+
+
+def get_stream_size(stream):
+    """
+    Returns size of the regular file underlying the stream in bytes or None if the size is unknown.
+    """
+    try:
+        file_stat = os.fstat(stream.fileno())
+    except (AttributeError, OSError, ValueError):
+        return None
+    return file_stat.st_size if stat.S_ISREG(file_stat.st_mode) else None
+
+
+def is_seekable(stream):
+    try:
+        return stream.seekable()
+    except (AttributeError, ValueError):
+        return False
+
+
+class ProgressStream:
+    """
+    Wraps the CSV stream (text or binary file or an iterable of lines) which is read in a single pass and tracks
+    number of the read bytes to compute progress of the import without counting rows. If the stream is backed by
+    a regular file (for example opened file or gzip reader), the offset of the underlying file is used, otherwise
+    length of the read lines is summed.
+    """
+
+    def __init__(self, stream, encoding='utf-8'):
+        if isinstance(stream, (io.RawIOBase, io.BufferedIOBase)):
+            stream = io.TextIOWrapper(stream, encoding=encoding, newline='')
+        self.stream = stream
+        self.total_bytes = get_stream_size(stream)
+        self._fileno = None
+        self._start_offset = 0
+        self._read_length = 0
+        if self.total_bytes is not None:
+            try:
+                self._fileno = stream.fileno()
+                self._start_offset = os.lseek(self._fileno, 0, os.SEEK_CUR)
+                self.total_bytes -= self._start_offset
+            except OSError:
+                self._fileno = None
+
+    def __iter__(self):
+        if self._fileno is not None:
+            return iter(self.stream)
+        else:
+            return self._iterate_with_length()
+
+    def _iterate_with_length(self):
+        for line in self.stream:
+            self._read_length += len(line)
+            yield line
+
+    @property
+    def read_bytes(self):
+        if self._fileno is not None:
+            return os.lseek(self._fileno, 0, os.SEEK_CUR) - self._start_offset
+        else:
+            return self._read_length
+
+    @property
+    def progress(self):
+        """
+        Returns ratio of the read bytes (0 to 1) or None if the size of the stream is unknown.
+        """
+        if self.total_bytes is None:
+            return None
+        return min(self.read_bytes / self.total_bytes, 1.0) if self.total_bytes > 0 else 1.0
+
+
+# Row number is the number of the CSV record (header included), multi-line quoted values are counted as one record
+CSVRowError = namedtuple('CSVRowError', ('row_number', 'row', 'error'))
+
+
+def _get_csv_row_error(row_number, row, ex):
+    return CSVRowError(row_number, row, '{}: {}'.format(ex.__class__.__name__, ex))
+
+
+class CSVImportError(Exception):
+    """
+    Raised after the import if some rows could not be imported, errors are ordered by the CSV record number.
+    """
+
+    def __init__(self, errors):
+        super().__init__('{} rows could not be imported'.format(len(errors)))
+        self.errors = errors
+
+
+def _find_row_end(data, row_start, offset, quote):
+    """
+    Returns offset after the first newline from the `offset` which is not inside a quoted value. `row_start` must be
+    the row boundary.
+    """
+    quotes = 0
+    while True:
+        newline = data.find(b'\n', offset)
+        if newline == -1:
+            return len(data)
+        quotes += data[row_start:newline].count(quote)
+        if quotes % 2 == 0:
+            return newline + 1
+        row_start, offset = newline, newline + 1
+
+
+def get_row_chunks(data, chunk_size, quote=b'"', skip_header=False):
+    """
+    Splits the memory mapped CSV data to byte ranges of approximately `chunk_size` bytes aligned on the row
+    boundaries (newlines outside of the quoted values).
+    :return: list of the (start, end) tuples
+    """
+    start = _find_row_end(data, 0, 0, quote) if skip_header else 0
+    chunks = []
+    while start < len(data):
+        end = _find_row_end(data, start, start + chunk_size - 1, quote) if start + chunk_size < len(data) else len(data)
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+_parallel_importer = None
+
+
+def _init_parallel_worker(importer):
+    global _parallel_importer
+
+    _parallel_importer = importer
+
+
+def _clean_parallel_chunk(path, start, end):
+    """
+    Parses and cleans rows of the CSV file byte range in the worker process. Exception of the clean is raised unless
+    the importer skips invalid rows.
+    :return: tuple of the list of fields dicts, list of the row errors (with the CSV record number inside the chunk)
+        and number of the parsed CSV records
+    """
+    importer = _parallel_importer
+    with open(path, 'rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode(importer.get_encoding())
+
+    fields_dicts, errors, row_count = [], [], 0
+    skip_invalid_rows = importer.get_skip_invalid_rows()
+    for row_count, row in enumerate(csv.reader(io.StringIO(text, newline=''), delimiter=importer.get_delimiter()), 1):
+        if any(row):  # Skip blank lines
+            try:
+                fields_dicts.append(importer.get_fields_dict(row))
+            except Exception as ex:  # pylint: disable=W0703
+                if not skip_invalid_rows:
+                    raise
+                errors.append(_get_csv_row_error(row_count, row, ex))
+    return fields_dicts, errors, row_count
+
+
+def _map_ordered(executor, func, args_list, max_pending):
+    """
+    Submits jobs to the executor with at most `max_pending` jobs in progress and yields results in order.
+    """
+    pending = deque()
+    for args in args_list:
+        pending.append(executor.submit(func, *args))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
 class DummyOutputStream(io.StringIO):
 
     def write(self, *args, **kwargs):
@@ -24,6 +296,9 @@ class AbstractCSVImporter:
         * The class implements __call__ method to allow calling concrete importers as regular functions.
         * __call__ accepts custom CSV path to import different CSV files with the same instance of the importer.
         * all class properties can be set dynamically with getters.
+        * in the streaming mode the file is imported in a single pass without counting rows, therefore non-seekable
+          streams (pipes, HTTP bodies, gzip readers or iterables of lines) can be imported. Progress of the import
+          is available in the `progress_stream` (row count passed to the import hooks is None).
     """
 
     skip_header = True  # By default first line of CSV is assumed to contain headers and is skipped
@@ -31,21 +306,30 @@ class AbstractCSVImporter:
     csv_path = ''  # Path to the CSV file relative to Django PROJECT_DIR
     delimiter = ';'
     encoding = 'utf-8'
+    exact_row_count = False  # Do not count newlines in quoted values (slower), only if rows are counted
+    streaming = False  # Import the file in a single pass, non-seekable streams are always imported in this mode
+    progress_stream = None
+    _row_cleaner = None
 
     def __call__(self, file):
         """file is a required parameter as calling the function without CSV file does not make sense"""
         self.import_csv(file)
 
     def import_csv(self, file=None):
-        if not file:
-            with open(self.csv_path, encoding=self.get_encoding()) as file:
+        with self._compile_row_cleaner():
+            if not file:
+                with open(self.csv_path, encoding=self.get_encoding()) as file:
+                    self._import_csv(file)
+            else:
                 self._import_csv(file)
-        else:
-            self._import_csv(file)
 
     def _import_csv(self, file):
+        if self.get_streaming() or not is_seekable(file):
+            self._import_csv_stream(file)
+            return
+
         reader = csv.reader(file, delimiter=self.get_delimiter())
-        row_count = simple_count(file)
+        row_count = fast_count(file, exact=self.get_exact_row_count(), delimiter=self.get_delimiter())
         file.seek(0)
         if self.get_skip_header():
             next(reader, None)
@@ -55,6 +339,16 @@ class AbstractCSVImporter:
             row_count=row_count,
         )
 
+    def _import_csv_stream(self, file):
+        self.progress_stream = ProgressStream(file, encoding=self.get_encoding())
+        try:
+            reader = csv.reader(self.progress_stream, delimiter=self.get_delimiter())
+            if self.get_skip_header():
+                next(reader, None)
+            self.import_rows(reader, row_count=None)
+        finally:
+            self.progress_stream = None
+
     def import_rows(self, reader, row_count=0):
         raise NotImplementedError
 
@@ -75,17 +369,67 @@ class AbstractCSVImporter:
     def get_skip_header(self):
         return self.skip_header
 
+    def get_streaming(self):
+        return self.streaming
+
+    def get_exact_row_count(self):
+        return self.exact_row_count
+
     def get_fields(self):
         return self.fields
 
+    def compile_row_cleaner(self):
+        """
+        Returns function which converts the row to the fields dict. Fields and clean methods are resolved when the
+        function is compiled and fields without clean method are not cleaned at all.
+        """
+        fields = tuple(self.get_fields())
+        field_count = len(fields)
+        cleaners = tuple(
+            (index, field_name, getattr(self, 'clean_{}'.format(field_name)))
+            for index, field_name in enumerate(fields) if hasattr(self, 'clean_{}'.format(field_name))
+        )
+        missing_values = (None,) * field_count
+
+        def clean_row(row):
+            if len(row) > field_count:
+                # Values without fields are aligned with None field name
+                return {k: getattr(self, 'clean_{}'.format(k), lambda x: x)(v.strip() if isinstance(v, str) else None)
+                        for k, v in zip_longest(fields, row)}
+
+            values = [v.strip() if isinstance(v, str) else None for v in row]
+            values.extend(missing_values[len(values):])
+            fields_dict = dict(zip(fields, values))
+            for index, field_name, cleaner in cleaners:
+                fields_dict[field_name] = cleaner(values[index])
+            return fields_dict
+        return clean_row
+
+    @contextmanager
+    def _compile_row_cleaner(self):
+        """
+        Fields and clean methods are resolved only once per import, the row cleaner is compiled when the import
+        starts and it is removed after the import (fields can be changed between imports).
+        """
+        if self._row_cleaner is not None:
+            # Row cleaner was already compiled by the outer import method
+            yield
+        else:
+            self._row_cleaner = self.compile_row_cleaner()
+            try:
+                yield
+            finally:
+                self._row_cleaner = None
+
     def get_fields_dict(self, row):
         """
         Returns a dict of field name and cleaned value pairs to initialize the model.
         Beware, it aligns the lists of fields and row values with Nones to allow for adding fields not found in the CSV.
         Whitespace around the value of the cell is stripped.
+        Row cleaner compiled for the import is used, outside of the import it is compiled with every call.
         """
-        return {k: getattr(self, 'clean_{}'.format(k), lambda x: x)(v.strip() if isinstance(v, str) else None)
-                for k, v in zip_longest(self.get_fields(), row)}
+        row_cleaner = self._row_cleaner if self._row_cleaner is not None else self.compile_row_cleaner()
+        return row_cleaner(row)
 
     def _pre_import_rows(self, row_count):
         pass
@@ -95,46 +439,155 @@ class AbstractCSVImporter:
 
 
 class BulkCSVImporter(AbstractCSVImporter):
+    """
+    Bulk CSV importer creates objects in batches.
+        * if `parallel_workers` is set, plain files are split to byte ranges aligned on the row boundaries which are
+          parsed and cleaned in the process pool (requires fork start method, clean methods should not use the
+          database). Database connections are closed before the worker processes are forked, therefore files are
+          imported serially inside an atomic block (a warning is logged). Cleaned rows are created in the file order.
+        * the import stops with the exception of the first row whose clean fails. If `skip_invalid_rows` is set,
+          invalid rows are skipped and CSVImportError with errors of all invalid rows (with the number of the CSV
+          record, not the file line) is raised after the import.
+    """
 
     delete_existing_objects = False  # Set to true if you want to delete all records in the model table
+    skip_invalid_rows = False  # Set to true to import valid rows and raise CSVImportError after the import
     batch_size = 10000
+    parallel_workers = None  # Number of processes which parse and clean rows
+    parallel_chunk_size = 4 * 1024 * 1024  # Approximate size of the file part parsed by a worker in bytes
+
+    def _get_parallel_path(self, file):
+        if not self.get_parallel_workers() or 'fork' not in multiprocessing.get_all_start_methods():
+            return None
+        if any(connection.in_atomic_block for connection in connections.all()):
+            logger.warning(
+                'Parallel workers of the %s are ignored inside an atomic block, the file is imported serially',
+                self.__class__.__name__
+            )
+            return None
+        raw = _get_raw_file(file)
+        if raw is None or not isinstance(raw.name, str) or not _is_ascii_compatible(self.get_encoding()):
+            return None
+        try:
+            return raw.name if file.tell() == 0 and os.path.isfile(raw.name) else None
+        except (OSError, ValueError):
+            return None
 
-    def create_batch(self, chunk):
-        return len(self.model_class.objects.bulk_create(chunk))
-
-    def import_rows(self, reader, row_count=0):
-        self._pre_import_rows(row_count)
-
-        if self.get_delete_existing_objects():
-            self.model_class.objects.all().delete()
-
-        if self.get_skip_header():
+    def _import_csv(self, file):
+        path = self._get_parallel_path(file)
+        if path is None:
+            super()._import_csv(file)
+        else:
+            self._import_csv_parallel(path)
+
+    def _import_csv_parallel(self, path):
+        with open(path, 'rb') as file:
+            row_count = fast_count(file, exact=self.get_exact_row_count(), delimiter=self.get_delimiter())
+            if row_count == 0:
+                chunks = []
+            else:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    chunks = get_row_chunks(
+                        data, self.get_parallel_chunk_size(), skip_header=self.get_skip_header()
+                    )
+        if self.get_skip_header() and row_count:
             row_count -= 1
+        self.import_rows_parallel(path, chunks, row_count=row_count)
 
-        batch, created = [], 0
+    def import_rows_parallel(self, path, chunks, row_count=0):
+        """
+        Imports rows of the file chunks (byte ranges) parsed and cleaned in the process pool.
+        """
+        with self._compile_row_cleaner():
+            self._pre_import_rows(row_count)
+
+            if self.get_delete_existing_objects():
+                self.model_class.objects.all().delete()
+
+            batch, created, errors = [], 0, []
+            parsed_row_count = 1 if self.get_skip_header() else 0
+            workers = self.get_parallel_workers()
+            # Forked processes must not share the database connections of the parent process
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                     initializer=_init_parallel_worker, initargs=(self,)) as executor:
+                results = _map_ordered(
+                    executor, _clean_parallel_chunk, ((path, start, end) for start, end in chunks), 2 * workers
+                )
+                for fields_dicts, chunk_errors, chunk_row_count in results:
+                    errors += [
+                        error._replace(row_number=parsed_row_count + error.row_number) for error in chunk_errors
+                    ]
+                    parsed_row_count += chunk_row_count
+                    for fields_dict in fields_dicts:
+                        batch.append(self.create_instance_from_fields_dict(fields_dict))
+                        if len(batch) >= self.get_batch_size():
+                            created += self.create_batch(batch)
+                            self._post_batch_create(len(batch), row_count)
+                            batch = []
+            created += self.create_batch(batch)
+            self._post_batch_create(len(batch), row_count)
+            self._post_import_rows(created)
+
+            if errors:
+                raise CSVImportError(errors)
+            return created
 
-        for i, row in enumerate(reader):
-            if i % self.get_batch_size() == 0 and i > 0:
-                created += self.create_batch(batch)
-                self._post_batch_create(self.get_batch_size(), row_count)
-                del batch[:]
-            if any(row):  # Skip blank lines
-                batch.append(self.create_instance(row))
-        created += self.create_batch(batch)
-        self._post_batch_create(len(batch), row_count)
-        self._post_import_rows(created)
+    def create_batch(self, chunk):
+        return len(self.model_class.objects.bulk_create(chunk))
 
-        return created
+    def import_rows(self, reader, row_count=0):
+        with self._compile_row_cleaner():
+            self._pre_import_rows(row_count)
+
+            if self.get_delete_existing_objects():
+                self.model_class.objects.all().delete()
+
+            batch, created, errors = [], 0, []
+            skip_invalid_rows = self.get_skip_invalid_rows()
+            first_row_number = 2 if self.get_skip_header() else 1
+
+            for i, row in enumerate(reader):
+                if i % self.get_batch_size() == 0 and i > 0:
+                    created += self.create_batch(batch)
+                    self._post_batch_create(self.get_batch_size(), row_count)
+                    del batch[:]
+                if any(row):  # Skip blank lines
+                    try:
+                        batch.append(self.create_instance(row))
+                    except Exception as ex:  # pylint: disable=W0703
+                        if not skip_invalid_rows:
+                            raise
+                        errors.append(_get_csv_row_error(first_row_number + i, row, ex))
+            created += self.create_batch(batch)
+            self._post_batch_create(len(batch), row_count)
+            self._post_import_rows(created)
+
+            if errors:
+                raise CSVImportError(errors)
+            return created
 
     def create_instance(self, row):
-        return self.model_class(**self.get_fields_dict(row))
+        return self.create_instance_from_fields_dict(self.get_fields_dict(row))
+
+    def create_instance_from_fields_dict(self, fields_dict):
+        return self.model_class(**fields_dict)
 
     def get_delete_existing_objects(self):
         return self.delete_existing_objects
 
+    def get_skip_invalid_rows(self):
+        return self.skip_invalid_rows
+
     def get_batch_size(self):
         return self.batch_size
 
+    def get_parallel_workers(self):
+        return self.parallel_workers
+
+    def get_parallel_chunk_size(self):
+        return self.parallel_chunk_size
+
     def _post_batch_create(self, created_count, row_count):
         pass
 
@@ -143,11 +596,17 @@ class CSVImporter(AbstractCSVImporter):
 
     query_fields = ()  # Fields used to get existing instances of the model in update_or_create, by default all fields
     update_fields = ()  # Fields that should be set by the update_or_create method
+    batch_size = None  # Set to upsert rows in batches instead of calling update_or_create for every row
 
     def import_rows(self, reader, row_count=0):
-        self._pre_import_rows(row_count)
-        created_flags = [self.row_to_model(row) for row in reader if any(row)]
-        self._post_import_rows(sum(created_flags), len(created_flags) - sum(created_flags))
+        with self._compile_row_cleaner():
+            self._pre_import_rows(row_count)
+            if self.get_batch_size():
+                created_count, updated_count = self.upsert_rows(reader)
+                self._post_import_rows(created_count, updated_count)
+            else:
+                created_flags = [self.row_to_model(row) for row in reader if any(row)]
+                self._post_import_rows(sum(created_flags), len(created_flags) - sum(created_flags))
 
     def row_to_model(self, row):
         fields_dict = self.get_fields_dict(row)
@@ -157,6 +616,143 @@ class CSVImporter(AbstractCSVImporter):
         )
         return created
 
+    def upsert_rows(self, reader):
+        """
+        Upserts rows in batches with the same result as update_or_create called for every row. Existing objects
+        of the batch are found with one query, new objects are created with one bulk create and existing objects
+        are updated with one bulk update. SmartModel objects are saved with smart bulk methods.
+        :return: tuple of the created and updated objects count
+        """
+        batch, created_count, updated_count = [], 0, 0
+        for row in reader:
+            if any(row):  # Skip blank lines
+                batch.append(self.get_fields_dict(row))
+            if len(batch) >= self.get_batch_size():
+                batch_created_count, batch_updated_count = self.upsert_batch(batch)
+                created_count += batch_created_count
+                updated_count += batch_updated_count
+                del batch[:]
+        if batch:
+            batch_created_count, batch_updated_count = self.upsert_batch(batch)
+            created_count += batch_created_count
+            updated_count += batch_updated_count
+        return created_count, updated_count
+
+    def _get_key(self, values):
+        """
+        Returns key of the query field values normalized the same way as values of the database query (naive and
+        aware datetimes, numbers in strings etc.), therefore keys of the rows and the objects can be compared.
+        """
+        key = []
+        for field_name, value in zip(self.get_query_fields(), values):
+            if isinstance(value, models.Model):
+                value = value.pk
+            field = self.model_class._meta.get_field(field_name)
+            key.append(field.get_prep_value(field.to_python(value)))
+        return tuple(key)
+
+    def _get_query_key(self, query_dict):
+        return self._get_key(query_dict.get(field_name) for field_name in self.get_query_fields())
+
+    def _get_obj_query_key(self, obj):
+        return self._get_key(
+            getattr(obj, self.model_class._meta.get_field(field_name).attname) for field_name in self.get_query_fields()
+        )
+
+    def _get_existing_objects_queryset(self, query_dicts):
+        query_fields = self.get_query_fields()
+        if len(query_fields) == 1 and all(query_dict.get(query_fields[0]) is not None for query_dict in query_dicts):
+            return self.model_class.objects.filter(
+                **{'{}__in'.format(query_fields[0]): {query_dict[query_fields[0]] for query_dict in query_dicts}}
+            )
+        else:
+            return self.model_class.objects.filter(
+                reduce(or_, (models.Q(**query_dict) for query_dict in query_dicts))
+            )
+
+    def _get_existing_objects(self, query_dicts, query_keys):
+        """
+        Returns dict of the existing objects by the query key. Objects are found with IN or tuple lookups of at most
+        EXISTING_OBJECTS_QUERY_SIZE rows. If the database finds objects by values which are not equal to the row
+        values (for example with case insensitive collation), rows without found object are looked up one by one.
+        """
+        connection = connections[self.model_class.objects.db]
+        query_size = max(
+            min(EXISTING_OBJECTS_QUERY_SIZE, connection.ops.bulk_batch_size(self.get_query_fields(), query_dicts)), 1
+        )
+        existing_objects = {}
+        for i in range(0, len(query_dicts), query_size):
+            for obj in self._get_existing_objects_queryset(query_dicts[i:i + query_size]):
+                key = self._get_obj_query_key(obj)
+                if key in existing_objects and existing_objects[key].pk != obj.pk:
+                    raise MultipleObjectsReturned(
+                        'Multiple {} objects were found by the query fields {}.'.format(
+                            self.model_class._meta.object_name, dict(zip(self.get_query_fields(), key))
+                        )
+                    )
+                existing_objects[key] = obj
+
+        if not set(existing_objects).issubset(query_keys):
+            for query_dict, key in zip(query_dicts, query_keys):
+                if key not in existing_objects:
+                    try:
+                        existing_objects[key] = self.model_class.objects.get(**query_dict)
+                    except self.model_class.DoesNotExist:
+                        pass
+        return existing_objects
+
+    def upsert_batch(self, fields_dicts):
+        """
+        Creates or updates objects of the batch of fields dicts in one transaction.
+        :return: tuple of the created and updated objects count
+        """
+        from chamber.models import SmartModel
+
+        query_dicts = [self.get_query_dict(fields_dict) for fields_dict in fields_dicts]
+        update_dicts = [self.get_update_dict(fields_dict) for fields_dict in fields_dicts]
+        query_keys = [self._get_query_key(query_dict) for query_dict in query_dicts]
+        created_objs, updated_objs = {}, {}
+        with transaction.atomic(using=self.model_class.objects.db):
+            existing_objects = self._get_existing_objects(query_dicts, query_keys)
+            for query_dict, update_dict, key in zip(query_dicts, update_dicts, query_keys):
+                obj = existing_objects.get(key, created_objs.get(key))
+                if obj is None:
+                    # Update values take precedence as with update_or_create defaults
+                    created_objs[key] = self.model_class(**{**query_dict, **update_dict})
+                else:
+                    # Later rows with the same query fields update the object as update_or_create does
+                    for field_name, value in update_dict.items():
+                        setattr(obj, field_name, value)
+                    if key in existing_objects:
+                        updated_objs[key] = obj
+
+            update_field_names = list(self.get_update_fields())
+            if issubclass(self.model_class, SmartModel):
+                self.model_class.objects.smart_bulk_create(created_objs.values())
+                if updated_objs and update_field_names:
+                    self.model_class.objects.smart_bulk_update(
+                        updated_objs.values(), update_only_changed_fields=True
+                    )
+            else:
+                self.model_class.objects.bulk_create(created_objs.values())
+                if updated_objs and update_field_names:
+                    # Auto now fields are updated the same way as with the model save method
+                    auto_now_fields = [
+                        field for field in self.model_class._meta.concrete_fields if getattr(field, 'auto_now', False)
+                    ]
+                    for obj in updated_objs.values():
+                        for field in auto_now_fields:
+                            field.pre_save(obj, False)
+                    update_field_names += [
+                        field.name for field in auto_now_fields if field.name not in update_field_names
+                    ]
+                    self.model_class.objects.bulk_update(updated_objs.values(), update_field_names)
+        created_count = len(created_objs)
+        return created_count, len(fields_dicts) - created_count
+
+    def get_batch_size(self):
+        return self.batch_size
+
     def get_query_fields(self):
         return self.query_fields or self.fields
 
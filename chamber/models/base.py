@@ -1,4 +1,12 @@
-from django.db import transaction, models, OperationalError
+from collections import Counter
+from contextlib import nullcontext
+
+import django
+
+from django.db import connections, transaction, models, NotSupportedError, OperationalError
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.functions import RowNumber
+from django.db.models.deletion import Collector
 from django.db.models.manager import BaseManager
 from django.db.models.base import ModelBase
 from django.core.exceptions import ValidationError
@@ -8,33 +16,290 @@ from django.utils.functional import cached_property
 from chamber.exceptions import PersistenceException
 from chamber.patch import Options
 from chamber.shortcuts import change_and_save, change, bulk_change_and_save
-from chamber.config import settings
+from chamber.config import settings, DEFAULTS
+from chamber.utils.field_registry import get_field_registry
 
 from .changed_fields import DynamicChangedFields
+from .instrumentation import measure_stage
 from .signals import dispatcher_post_save, dispatcher_pre_save
 
 
+FAST_DISTINCT_STRATEGIES = ('pk_in', 'exists', 'distinct_on', 'window')
+
+
 class SmartQuerySetMixin:
 
-    def fast_distinct(self):
+    def _has_multivalued_joins(self):
+        """
+        Returns True if the query can return one object more times (it joins reverse or many to many relations,
+        extra tables or it is ordered by related fields).
+        """
+        return (
+            bool(self.query.extra_tables)
+            or any(not isinstance(order, str) or LOOKUP_SEP in order for order in self.query.order_by)
+            or any(
+                join_field is not None and (join_field.one_to_many or join_field.many_to_many)
+                for join_field in (getattr(join, 'join_field', None) for join in self.query.alias_map.values())
+            )
+        )
+
+    def _is_ordered_only_by_pk(self):
+        if self.query.order_by:
+            return self.query.order_by[0] in {'pk', self.model._meta.pk.name, self.model._meta.pk.attname}
+        else:
+            return not (self.query.default_ordering and self.model._meta.ordering)
+
+    def _get_fast_distinct_strategy(self):
+        """
+        Chooses the fast distinct strategy according to the database backend and the query shape. None is returned
+        if the query cannot contain duplicates.
+        """
+        if not self._has_multivalued_joins():
+            return None
+
+        vendor = connections[self.db].vendor
+        if vendor == 'postgresql' and self._is_ordered_only_by_pk():
+            return 'distinct_on'
+        elif vendor in {'mysql', 'sqlite'}:
+            # Large IN subqueries are materialized, correlated EXISTS uses the primary key index
+            return 'exists'
+        else:
+            return 'pk_in'
+
+    def _fast_distinct_pk_in(self):
+        return self.model.objects.filter(pk__in=self.values('pk'))
+
+    def _fast_distinct_exists(self):
+        return self.model.objects.filter(models.Exists(self.order_by().filter(pk=models.OuterRef('pk'))))
+
+    def _fast_distinct_distinct_on(self):
+        if not connections[self.db].features.can_distinct_on_fields:
+            raise NotSupportedError('DISTINCT ON fields is not supported by this database backend.')
+        if not self._is_ordered_only_by_pk():
+            raise ValueError('DISTINCT ON strategy of fast_distinct() requires queryset ordered by primary key.')
+        return self.order_by('pk').distinct('pk')
+
+    def _fast_distinct_window(self):
+        if django.VERSION < (4, 2) or not connections[self.db].features.supports_over_clause:
+            raise NotSupportedError('Filtering by window functions is not supported.')
+        return self.alias(
+            _fast_distinct_row_number=models.Window(RowNumber(), partition_by=models.F('pk'))
+        ).filter(_fast_distinct_row_number=1)
+
+    def fast_distinct(self, strategy=None):
         """
         Because standard distinct used on the all fields are very slow and works only with PostgreSQL database
         this method provides alternative to the standard distinct method.
+        :param strategy: one of the strategies "pk_in" (pk IN subquery, default), "exists" (EXISTS correlated
+            subquery), "distinct_on" (DISTINCT ON pk, PostgreSQL only), "window" (row number window function) or
+            "auto" (the strategy is chosen according to the database backend and the query shape)
         :return: qs with unique objects
         """
-        qs = self.model.objects.filter(pk__in=self.values('pk'))
-        if self.query.order_by:
+        if strategy is None:
+            strategy = 'pk_in'
+        elif strategy == 'auto':
+            strategy = self._get_fast_distinct_strategy()
+            if strategy is None:
+                return self.filter()
+        elif strategy not in FAST_DISTINCT_STRATEGIES:
+            raise ValueError('Invalid fast_distinct() strategy "{}".'.format(strategy))
+
+        qs = getattr(self, '_fast_distinct_{}'.format(strategy))()
+        if strategy in {'pk_in', 'exists'} and self.query.order_by:
             qs = qs.order_by(*self.query.order_by)
         return qs
 
-    def change_and_save(self, update_only_changed_fields=False, **changed_fields):
+    def change_and_save(self, update_only_changed_fields=False, bulk=False, **changed_fields):
         """
         Changes a given `changed_fields` on each object in the queryset, saves objects
         and returns the changed objects in the queryset.
+        If `bulk` is set, objects are saved with the `smart_bulk_update` method.
         """
-        bulk_change_and_save(self, update_only_changed_fields=update_only_changed_fields, **changed_fields)
+        bulk_change_and_save(
+            self, update_only_changed_fields=update_only_changed_fields, bulk=bulk, **changed_fields
+        )
         return self.filter()
 
+    def _get_bulk_update_groups(self, objs, changed_fields_list, update_only_changed_fields):
+        """
+        Returns list of tuples (objects, fields) which should be updated together. If only changed fields should be
+        updated, objects are grouped by the same set of the changed fields (signature) to update every object only
+        with its changed fields and with one bulk update per group. Objects without changed fields are not updated.
+        """
+        concrete_fields = get_field_registry(self.model).concrete_fields
+        if not update_only_changed_fields:
+            return [(objs, [field for field in concrete_fields if not field.primary_key])]
+
+        objs_by_signature = {}
+        for obj, changed_fields in zip(objs, changed_fields_list):
+            signature = frozenset(obj._get_update_fields(changed_fields))  # pylint: disable=W0212
+            if signature:
+                objs_by_signature.setdefault(signature, []).append(obj)
+        return [
+            (signature_objs, [field for field in concrete_fields if field.name in signature])
+            for signature, signature_objs in objs_by_signature.items()
+        ]
+
+    def _pre_save_bulk_update_fields(self, objs, fields):
+        """
+        Prepares values of the fields before update the same way as the model save method. Auto now fields get
+        the same value for all objects.
+        """
+        for field in fields:
+            if getattr(field, 'auto_now', False):
+                value = field.pre_save(objs[0], False)
+                for obj in objs[1:]:
+                    setattr(obj, field.attname, value)
+            else:
+                for obj in objs:
+                    field.pre_save(obj, False)
+
+    def _bulk_update_objs(self, objs, fields, batch_size=None):
+        """
+        Updates objects in the database. If all objects have the same values, one UPDATE query (per batch) is used,
+        otherwise Django bulk_update is used.
+        """
+        for obj in objs:
+            obj._prepare_related_fields_for_save(operation_name='smart_bulk_update')  # pylint: disable=W0212
+
+        objs_values = [[getattr(obj, field.attname) for field in fields] for obj in objs]
+        if all(obj_values == objs_values[0] for obj_values in objs_values):
+            batch_size = batch_size or max(connections[self.db].ops.bulk_batch_size(['pk'], objs), 1)
+            update_kwargs = {field.attname: value for field, value in zip(fields, objs_values[0])}
+            for i in range(0, len(objs), batch_size):
+                self.model._base_manager.using(self.db).filter(
+                    pk__in=[obj.pk for obj in objs[i:i + batch_size]]
+                ).update(**update_kwargs)
+        else:
+            self.model._base_manager.using(self.db).bulk_update(
+                objs, [field.name for field in fields], batch_size=batch_size
+            )
+
+    def smart_bulk_update(self, objs, update_only_changed_fields=False, is_cleaned_pre_save=None,
+                          is_cleaned_post_save=None, batch_size=None, **kwargs):
+        """
+        Saves stored objects with the SmartModel save sequence, but the objects are updated in the database
+        in batches:
+        * pre-save methods, pre-save validation and pre-save signals are called for every object
+        * objects are updated with one query per batch (Django pre_save and post_save signals are not sent), if
+          `update_only_changed_fields` is set, objects are grouped by the set of the changed fields and every group
+          is updated only with its changed fields
+        * post-save methods, post-save validation and post-save signals are called for every object with its
+          changed fields
+        The whole update is performed in one transaction.
+        """
+        objs = list(objs)
+        if not objs:
+            return
+        if any(obj.pk is None or obj.is_adding for obj in objs):
+            raise ValueError('All smart_bulk_update() objects must be stored in the database.')
+
+        with transaction.atomic(using=self.db):
+            objs_kwargs = []
+            changed_fields_list = []
+            for obj in objs:
+                obj_kwargs = {**kwargs, **obj._get_save_extra_kwargs()}  # pylint: disable=W0212
+                _, changed_fields = obj._run_pre_save(is_cleaned_pre_save, **obj_kwargs)  # pylint: disable=W0212
+                objs_kwargs.append(obj_kwargs)
+                changed_fields_list.append(changed_fields)
+
+            for group_objs, fields in self._get_bulk_update_groups(
+                    objs, changed_fields_list, update_only_changed_fields):
+                if fields:
+                    self._pre_save_bulk_update_fields(group_objs, fields)
+                    self._bulk_update_objs(group_objs, fields, batch_size=batch_size)
+
+            for obj, changed_fields, obj_kwargs in zip(objs, changed_fields_list, objs_kwargs):
+                obj._reset_saved_state()  # pylint: disable=W0212
+                obj._run_post_save(True, changed_fields, is_cleaned_post_save, **obj_kwargs)  # pylint: disable=W0212
+
+    def smart_bulk_create(self, objs, is_cleaned_pre_save=None, is_cleaned_post_save=None, batch_size=None,
+                          **kwargs):
+        """
+        Creates objects with the SmartModel save sequence, but the objects are inserted to the database in batches:
+        * pre-save methods, pre-save validation and pre-save signals are called for every object
+        * objects are inserted with Django bulk_create (Django pre_save and post_save signals are not sent)
+        * post-save methods, post-save validation and post-save signals are called for every object with
+          changed=False
+        The whole insert is performed in one transaction. Primary keys of the objects are set only if the database
+        supports returning rows from the bulk insert.
+        """
+        objs = list(objs)
+        if not objs:
+            return objs
+        if any(not obj.is_adding for obj in objs):
+            raise ValueError('All smart_bulk_create() objects must not be stored in the database.')
+
+        with transaction.atomic(using=self.db):
+            objs_kwargs = []
+            changed_fields_list = []
+            for obj in objs:
+                obj_kwargs = {**kwargs, **obj._get_save_extra_kwargs()}  # pylint: disable=W0212
+                _, changed_fields = obj._run_pre_save(is_cleaned_pre_save, **obj_kwargs)  # pylint: disable=W0212
+                objs_kwargs.append(obj_kwargs)
+                changed_fields_list.append(changed_fields)
+
+            self.model._base_manager.using(self.db).bulk_create(objs, batch_size=batch_size)
+
+            for obj, changed_fields, obj_kwargs in zip(objs, changed_fields_list, objs_kwargs):
+                obj._reset_saved_state()  # pylint: disable=W0212
+                obj._run_post_save(False, changed_fields, is_cleaned_post_save, **obj_kwargs)  # pylint: disable=W0212
+        return objs
+
+    def _smart_delete_chunk(self, objs, is_cleaned_pre_delete, is_cleaned_post_delete, **kwargs):
+        for obj in objs:
+            obj._pre_delete(**kwargs)  # pylint: disable=W0212
+            if is_cleaned_pre_delete:
+                obj._clean_pre_delete(**kwargs)  # pylint: disable=W0212
+
+        # Loaded objects are deleted with the collector (as with the model delete), it sets primary keys to None
+        collector = Collector(using=kwargs.get('using') or self.db)
+        collector.collect(objs, keep_parents=kwargs.get('keep_parents', False))
+        deleted = collector.delete()
+
+        for obj in objs:
+            obj._post_delete(**kwargs)  # pylint: disable=W0212
+            if is_cleaned_post_delete:
+                obj._clean_post_delete(**kwargs)  # pylint: disable=W0212
+        return deleted
+
+    def smart_delete(self, chunk_size=1000, is_cleaned_pre_delete=None, is_cleaned_post_delete=None, **kwargs):
+        """
+        Deletes objects in the queryset with the SmartModel delete sequence, but the objects are loaded and deleted
+        in chunks (ordered by the primary key):
+        * pre-delete methods and pre-delete validation are called for every object in the chunk
+        * objects of the chunk are deleted together (DELETE ... WHERE pk IN) with the Django deletion collector
+        * post-delete methods and post-delete validation are called for every object in the chunk
+        If SmartMeta is_delete_atomic is set, every chunk is deleted in its own transaction. Keyword arguments `using`
+        and `keep_parents` are passed to the collector (as with the model delete).
+        :return: number of deleted objects (including cascade deleted objects) and dict with numbers of deleted objects
+            per model like QuerySet delete
+        """
+        smart_meta = self.model._smart_meta
+        is_cleaned_pre_delete = (
+            smart_meta.is_cleaned_pre_delete if is_cleaned_pre_delete is None else is_cleaned_pre_delete
+        )
+        is_cleaned_post_delete = (
+            smart_meta.is_cleaned_post_delete if is_cleaned_post_delete is None else is_cleaned_post_delete
+        )
+
+        queryset = self.order_by('pk')
+        deleted_count = 0
+        deleted_counter = Counter()
+        last_pk = None
+        while True:
+            objs = list((queryset if last_pk is None else queryset.filter(pk__gt=last_pk))[:chunk_size])
+            if not objs:
+                return deleted_count, dict(deleted_counter)
+            last_pk = objs[-1].pk
+            using = kwargs.get('using') or self.db
+            with transaction.atomic(using=using) if smart_meta.is_delete_atomic else nullcontext():
+                chunk_deleted_count, chunk_deleted_counter = self._smart_delete_chunk(
+                    objs, is_cleaned_pre_delete, is_cleaned_post_delete, **kwargs
+                )
+            deleted_count += chunk_deleted_count
+            deleted_counter.update(chunk_deleted_counter)
+
     def first(self, *field_names):
         """
         Adds possibility to set order fields to default Django first method.
@@ -102,7 +367,17 @@ class SmartModel(models.Model, metaclass=SmartModelBase):
         super().__init__(*args, **kwargs)
         self.is_adding = True
         self.is_changing = False
-        self._changed_fields = DynamicChangedFields(self)
+        self._changed_fields = DynamicChangedFields(
+            self, track_writes=True, snapshot_strategy=self._smart_meta.changed_fields_snapshot_strategy
+        )
+
+    def __setattr__(self, name, value):
+        # Changed fields are not initialized during the Django model init, assignment of the same object is ignored
+        changed_fields = self.__dict__.get('_changed_fields')
+        is_written = changed_fields is not None and (name not in self.__dict__ or self.__dict__[name] is not value)
+        super().__setattr__(name, value)
+        if is_written:
+            changed_fields.track_write(name)
 
     class Meta:
         abstract = True
@@ -115,10 +390,13 @@ class SmartModel(models.Model, metaclass=SmartModelBase):
         new = super().from_db(db, field_names, values)
         new.is_adding = False
         new.is_changing = True
-        updating_fields = [
-            f.name for f in cls._meta.concrete_fields
-            if len(values) == len(cls._meta.concrete_fields) or f.attname in field_names
-        ]
+        field_registry = get_field_registry(cls)
+        if len(values) == len(field_registry.concrete_fields):
+            updating_fields = field_registry.concrete_field_names
+        else:
+            updating_fields = [
+                field.name for field in field_registry.concrete_fields if field.attname in field_names
+            ]
         new._changed_fields.from_db(fields=updating_fields)
         return new
 
@@ -206,53 +484,77 @@ class SmartModel(models.Model, metaclass=SmartModelBase):
         * post-save validation is invoked (it is turned off by default)
         * post-save signals are invoked
         """
-        is_cleaned_pre_save = (
-            self._smart_meta.is_cleaned_pre_save if is_cleaned_pre_save is None else is_cleaned_pre_save
-        )
-        is_cleaned_post_save = (
-            self._smart_meta.is_cleaned_post_save if is_cleaned_post_save is None else is_cleaned_post_save
-        )
+        with measure_stage(self.__class__, 'save'):
+            kwargs.update(self._get_save_extra_kwargs())
+
+            # Changed fields must be cached before save, for post_save and signal purposes
+            post_save_is_changing, post_save_changed_fields = self._run_pre_save(
+                is_cleaned_pre_save, *args, **kwargs
+            )
 
-        origin = self.__class__
+            if not update_fields and update_only_changed_fields:
+                update_fields = self._get_update_fields(post_save_changed_fields)
+
+            with measure_stage(self.__class__, 'save_simple'):
+                self.save_simple(
+                    force_insert=force_insert, force_update=force_update, using=using, update_fields=update_fields
+                )
 
-        kwargs.update(self._get_save_extra_kwargs())
+            self._run_post_save(
+                post_save_is_changing, post_save_changed_fields, is_cleaned_post_save, *args, **kwargs
+            )
 
-        self._call_pre_save(
-            changed=self.is_changing, changed_fields=self.changed_fields.get_static_changes(), *args, **kwargs
+    def _run_pre_save(self, is_cleaned_pre_save=None, *args, **kwargs):
+        """
+        Calls pre-save methods, pre-save validation and pre-save signals.
+        :return: tuple of the is_changing value and the changed fields which should be used in the post save
+        """
+        is_cleaned_pre_save = (
+            self._smart_meta.is_cleaned_pre_save if is_cleaned_pre_save is None else is_cleaned_pre_save
         )
+
+        with measure_stage(self.__class__, 'pre_save'):
+            self._call_pre_save(
+                changed=self.is_changing, changed_fields=self.changed_fields.get_static_changes(), *args, **kwargs
+            )
         if is_cleaned_pre_save:
-            self._clean_pre_save(*args, **kwargs)
+            with measure_stage(self.__class__, 'clean_pre_save'):
+                self._clean_pre_save(*args, **kwargs)
         dispatcher_pre_save.send(
-            sender=origin, instance=self, changed=self.is_changing,
+            sender=self.__class__, instance=self, changed=self.is_changing,
             changed_fields=self.changed_fields.get_static_changes(),
             *args, **kwargs
         )
+        return self.is_changing, self.changed_fields.get_static_changes()
 
-        post_save_changed_fields = self.changed_fields.get_static_changes()
-
-        if not update_fields and update_only_changed_fields:
-            update_fields = list(post_save_changed_fields.keys()) + [
-                field.name for field in self._meta.fields if getattr(field, 'auto_now', False)
-            ]
-            # remove primary key from updating fields
-            if self._meta.pk.name in update_fields:
-                update_fields.remove(self._meta.pk.name)
-
-        # Changed fields must be cached before save, for post_save and signal purposes
-        post_save_is_changing = self.is_changing
-
-        self.save_simple(force_insert=force_insert, force_update=force_update, using=using, update_fields=update_fields)
-
-        self._call_post_save(
-            changed=post_save_is_changing, changed_fields=post_save_changed_fields, *args, **kwargs
+    def _run_post_save(self, changed, changed_fields, is_cleaned_post_save=None, *args, **kwargs):
+        """
+        Calls post-save methods, post-save validation and post-save signals.
+        """
+        is_cleaned_post_save = (
+            self._smart_meta.is_cleaned_post_save if is_cleaned_post_save is None else is_cleaned_post_save
         )
+
+        with measure_stage(self.__class__, 'post_save'):
+            self._call_post_save(changed=changed, changed_fields=changed_fields, *args, **kwargs)
         if is_cleaned_post_save:
-            self._clean_post_save(*args, **kwargs)
+            with measure_stage(self.__class__, 'clean_post_save'):
+                self._clean_post_save(*args, **kwargs)
         dispatcher_post_save.send(
-            sender=origin, instance=self, changed=post_save_is_changing, changed_fields=post_save_changed_fields,
-            *args, **kwargs
+            sender=self.__class__, instance=self, changed=changed, changed_fields=changed_fields, *args, **kwargs
         )
 
+    def _get_update_fields(self, changed_fields):
+        """
+        Returns names of the changed fields and auto now fields which should be updated in the database.
+        """
+        field_registry = get_field_registry(self)
+        update_fields = list(changed_fields.keys()) + list(field_registry.auto_now_field_names)
+        # remove primary key from updating fields
+        if field_registry.pk_name in update_fields:
+            update_fields.remove(field_registry.pk_name)
+        return update_fields
+
     def _post_save(self, changed, changed_fields, *args, **kwargs):
         """
         :param change: True if model instance was changed, False if was created
@@ -266,6 +568,9 @@ class SmartModel(models.Model, metaclass=SmartModelBase):
 
     def save_simple(self, *args, **kwargs):
         super().save(*args, **kwargs)
+        self._reset_saved_state()
+
+    def _reset_saved_state(self):
         self.is_adding = False
         self.is_changing = True
         self._changed_fields.from_db()
@@ -359,7 +664,8 @@ class SmartOptions(Options):
     meta_class_name = 'SmartMeta'
     meta_name = '_smart_meta'
     model_class = SmartModel
-    attributes = settings.SMART_MODEL_ATTRIBUTES
+    # Attributes missing in the project settings are filled with defaults
+    attributes = {**DEFAULTS['SMART_MODEL_ATTRIBUTES'], **settings.SMART_MODEL_ATTRIBUTES}
 
 
 class SmartAuditModel(AuditModelMixin, SmartModel):
@@ -1,9 +1,58 @@
+import ast
+import json
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from uuid import uuid4
 
 from django.core.cache import cache
+from django.db import connections
+from django.db.models import Max, Min, Q
 from django.utils.timezone import localtime
 
 
+def compute_expiration(expiration):
+    if isinstance(expiration, datetime):
+        return expiration
+    elif isinstance(expiration, int):
+        return localtime() + timedelta(seconds=expiration)
+    elif isinstance(expiration, timedelta):
+        return localtime() + expiration
+    else:
+        raise AttributeError('invalid value of expiration it can be datetime, integer or timedelta')
+
+
+def _parse_json_explain(explain_output):
+    try:
+        return json.loads(explain_output)
+    except ValueError:
+        # Django < 4.2 returns python representation of the JSON plan instead of JSON
+        return ast.literal_eval(explain_output)
+
+
+def estimate_count(queryset):
+    """
+    Returns estimated number of objects in the queryset from the database planner statistics without COUNT query.
+    PostgreSQL table statistics (reltuples) are used for not filtered querysets and EXPLAIN rows estimation for
+    filtered querysets. Exact count is returned for other databases or not analyzed tables.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        if queryset.query.has_filters():
+            return int(_parse_json_explain(queryset.explain(format='json'))[0]['Plan']['Plan Rows'])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [connection.ops.quote_name(queryset.model._meta.db_table)]
+            )
+            row = cursor.fetchone()
+        # Not analyzed table has reltuples -1 (PostgreSQL >= 14) or 0
+        if row and row[0] > 0:
+            return int(row[0])
+    return queryset.count()
+
+
 class BatchCachedQuerysetIterator:
     """
     Batch iterator that stores last iterated object in the cache.
@@ -23,9 +72,17 @@ class BatchCachedQuerysetIterator:
         iterator2 = BatchCachedQuerysetIterator(User.objects.all(), 'users', batch_size=100, expiration=10)
         # next 100 users are returned (users will be sorted by ID)
         list(iterator2)
+
+        iterator3 = BatchCachedQuerysetIterator(
+            User.objects.all(), 'changed_users', batch_size=100, expiration=10, ordering=('changed_at', 'pk')
+        )
+        # all remaining users are returned batch by batch, the next batch is loaded in a background thread
+        for user in iterator3.iterate_all_batches(prefetch=True):
+            ...
     """
 
-    def __init__(self, queryset, key, store_cursor_with_exception=False, batch_size=10000, expiration=None):
+    def __init__(self, queryset, key, store_cursor_with_exception=False, batch_size=10000, expiration=None,
+                 ordering=None, estimate_count=False):
         """
         Init batch cached queryset iterator
         :param queryset: queryset which you should want to iterate. Queryset should be sortable by ID
@@ -33,60 +90,344 @@ class BatchCachedQuerysetIterator:
         :param store_cursor_with_exception: store cursor in cache if exception will be occurred
         :param batch_size: size of one batch
         :param expiration: expiration in datatime, timedelta or integer (number of seconds) format
+        :param ordering: names of not nullable model fields used for ordering and as a keyset cursor (prefix "-"
+            means descending order), primary key is appended if it is not part of the ordering. Default is ('pk',)
+        :param estimate_count: number of objects is estimated from the database planner statistics instead of exact
+            COUNT query
         """
         self._batch_size = batch_size
         self._cache_key = f'batch_queryset_iterator_{key}'
         self._count_processed = 0
-        self._queryset = queryset.order_by('pk')
+        self._ordering = self._get_ordering(queryset.model, ordering)
+        self._cursor_attnames = [
+            'pk' if field_name.lstrip('-') == 'pk' else queryset.model._meta.get_field(field_name.lstrip('-')).attname
+            for field_name in self._ordering
+        ]
+        self._queryset = queryset.order_by(*self._ordering)
         self._cursor = self._cached_cursor = self._get_cursor()
         self._chunked_queryset = self._get_chunked_queryset(self._cursor)
         self._expiration = self._compute_expiration(expiration)
         self._store_cursor_with_exception = store_cursor_with_exception
+        self._estimate_count = estimate_count
+        self._counts_cache_key = f'{self._cache_key}_counts'
+        self._total_number_of_objects, self._remaining_number_of_objects = self._get_cached_counts()
+
+    def _get_ordering(self, model, ordering):
+        ordering = tuple(ordering) if ordering else ('pk',)
+        pk_names = {'pk', model._meta.pk.name, model._meta.pk.attname}
+        if not any(field_name.lstrip('-') in pk_names for field_name in ordering):
+            ordering += ('pk',)
+        return ordering
 
     def _compute_expiration(self, expiration):
-        if isinstance(expiration, datetime):
-            return expiration
-        elif isinstance(expiration, int):
-            return localtime() + timedelta(seconds=expiration)
-        elif isinstance(expiration, timedelta):
-            return localtime() + expiration
-        else:
-            raise AttributeError('invalid value of expiration it can be datetime, integer or timedelta')
+        return compute_expiration(expiration)
 
     def _get_cursor(self):
         return cache.get(self._cache_key)
 
+    def _get_cached_counts(self):
+        cached_counts = cache.get(self._counts_cache_key)
+        if cached_counts and cached_counts['cursor'] == self._cursor:
+            return cached_counts['total'], cached_counts['remaining']
+        else:
+            return None, None
+
     def _set_cursor(self):
         if self._cursor != self._cached_cursor:
-            cache.set(self._cache_key, self._cursor, (self._expiration - localtime()).total_seconds())
+            timeout = (self._expiration - localtime()).total_seconds()
+            cache.set(self._cache_key, self._cursor, timeout)
+            if self._total_number_of_objects is not None and self._remaining_number_of_objects is not None:
+                # Counts are stored with the cursor to be reused by the next iterator
+                cache.set(
+                    self._counts_cache_key,
+                    {
+                        'cursor': self._cursor,
+                        'total': self._total_number_of_objects,
+                        'remaining': self._remaining_number_of_objects
+                    },
+                    timeout
+                )
             self._cached_cursor = self._cursor
 
+    def _move_cursor(self, obj):
+        self._cursor = self._get_obj_cursor(obj)
+        if self._remaining_number_of_objects is not None:
+            self._remaining_number_of_objects = max(self._remaining_number_of_objects - 1, 0)
+
+    def _get_obj_cursor(self, obj):
+        """
+        Returns cursor of the object, cursor is a value of the primary key or a tuple of the ordering fields values.
+        """
+        if len(self._cursor_attnames) == 1:
+            return getattr(obj, self._cursor_attnames[0])
+        else:
+            return tuple(getattr(obj, attname) for attname in self._cursor_attnames)
+
+    def _get_keyset_filter(self, cursor):
+        """
+        Returns filter of objects behind the cursor, e.g. for ordering (a, b):
+        (a > cursor_a) OR (a = cursor_a AND b > cursor_b)
+        """
+        cursor_values = cursor if len(self._ordering) > 1 else (cursor,)
+        field_names = [field_name.lstrip('-') for field_name in self._ordering]
+        keyset_filter = Q()
+        for i, field_name in enumerate(self._ordering):
+            filter_kwargs = dict(zip(field_names[:i], cursor_values[:i]))
+            lookup = 'lt' if field_name.startswith('-') else 'gt'
+            filter_kwargs[f'{field_names[i]}__{lookup}'] = cursor_values[i]
+            keyset_filter |= Q(**filter_kwargs)
+        return keyset_filter
+
     def _filter_queryset_by_cursor(self, cursor):
         queryset = self._queryset
-        if cursor:
-            queryset = queryset.filter(pk__gt=cursor)
+        if cursor is not None:
+            queryset = queryset.filter(self._get_keyset_filter(cursor))
         return queryset
 
     def _get_chunked_queryset(self, cursor):
         return self._filter_queryset_by_cursor(cursor)[:self._batch_size]
 
+    def _fetch_batch(self, cursor):
+        return list(self._get_chunked_queryset(cursor))
+
     def __iter__(self):
         try:
             for obj in self._get_chunked_queryset(self._cursor):
                 yield obj
-                self._cursor = obj.pk
+                self._move_cursor(obj)
             self._set_cursor()
         finally:
             if self._store_cursor_with_exception:
                 self._set_cursor()
 
+    def _iterate_batches(self, prefetch):
+        # The prefetch thread uses its own connection which does not see data of the current transaction,
+        # therefore batches are loaded serially inside an atomic block
+        if not prefetch or connections[self._queryset.db].in_atomic_block:
+            batch = self._fetch_batch(self._cursor)
+            while batch:
+                yield batch
+                batch = self._fetch_batch(self._get_obj_cursor(batch[-1])) if len(batch) == self._batch_size else []
+        else:
+            # Django database connections are thread local, the prefetch thread uses its own connection
+            executor = ThreadPoolExecutor(max_workers=1)
+            try:
+                batch = executor.submit(self._fetch_batch, self._cursor).result()
+                while batch:
+                    next_batch_future = (
+                        executor.submit(self._fetch_batch, self._get_obj_cursor(batch[-1]))
+                        if len(batch) == self._batch_size else None
+                    )
+                    yield batch
+                    batch = next_batch_future.result() if next_batch_future else []
+            finally:
+                executor.submit(connections.close_all)
+                executor.shutdown(wait=True)
+
+    def iterate_all_batches(self, prefetch=False):
+        """
+        Iterates over all remaining objects batch by batch until the queryset is exhausted. Cursor is stored in the
+        cache after every complete batch, therefore iteration can be resumed by a new iterator with the same key.
+        :param prefetch: next batch is loaded in a background thread while the current batch is processed, inside
+            an atomic block batches are loaded serially (the background thread would not see uncommitted data)
+        """
+        try:
+            for batch in self._iterate_batches(prefetch):
+                for obj in batch:
+                    yield obj
+                    self._move_cursor(obj)
+                self._set_cursor()
+        finally:
+            if self._store_cursor_with_exception:
+                self._set_cursor()
+
+    def _count(self, queryset):
+        return estimate_count(queryset) if self._estimate_count else queryset.count()
+
     def __len__(self):
-        return self._get_chunked_queryset(self._cursor).count()
+        return min(self._batch_size, self.remaining_number_of_objects)
 
     @property
     def total_number_of_objects(self):
-        return self._queryset.count()
+        """
+        Number of objects is computed only once, the value is cached with the cursor.
+        """
+        if self._total_number_of_objects is None:
+            self._total_number_of_objects = self._count(self._queryset)
+        return self._total_number_of_objects
 
     @property
     def remaining_number_of_objects(self):
-        return self._filter_queryset_by_cursor(cursor=self._cursor).count()
+        """
+        Remaining number of objects is computed only once, then it is decreased with every iterated object.
+        """
+        if self._remaining_number_of_objects is None:
+            self._remaining_number_of_objects = (
+                self.total_number_of_objects if self._cursor is None
+                else self._count(self._filter_queryset_by_cursor(cursor=self._cursor))
+            )
+        return self._remaining_number_of_objects
+
+
+class ShardedBatchCachedQuerysetIterator:
+    """
+    Batch iterator which splits queryset into shards by primary key ranges. Every shard has its own cursor stored
+    in the cache (the same way as BatchCachedQuerysetIterator) and it can be processed only by one worker at a time.
+    Workers (threads, processes or nodes sharing the cache) claim shards with an atomic cache `add` lease, therefore
+    the queryset can be processed in parallel. Shard of a crashed worker can be claimed again after the lease timeout
+    and its iteration continues from the last complete batch.
+
+    Eq
+        def reindex_users(worker_number):
+            iterator = ShardedBatchCachedQuerysetIterator(
+                User.objects.all(),  # iterated queryset
+                'reindex_users',     # key used to store shards and cursors in cache
+                number_of_shards=8,  # number of primary key ranges
+                batch_size=100,      # size of one batch
+                expiration=3600,     # expiration of cached shards and cursors
+                lease_timeout=60     # timeout of the shard claim (it is renewed when half of it elapses)
+            )
+            for user in iterator.iterate_claimed_shards():
+                reindex(user)
+
+        with ProcessPoolExecutor(max_workers=8) as executor:
+            list(executor.map(reindex_users, range(8)))
+    """
+
+    def __init__(self, queryset, key, number_of_shards, store_cursor_with_exception=False, batch_size=10000,
+                 expiration=None, lease_timeout=600, split_by_percentiles=False):
+        """
+        Init sharded batch cached queryset iterator
+        :param queryset: queryset which you should want to iterate
+        :param key: unique key of your iterator which will be used for shards and cursors caching
+        :param number_of_shards: number of shards (primary key ranges)
+        :param store_cursor_with_exception: store cursor in cache if exception will be occurred
+        :param batch_size: size of one batch
+        :param expiration: expiration in datatime, timedelta or integer (number of seconds) format
+        :param lease_timeout: number of seconds after which a claimed shard is released if the lease is not renewed,
+            the lease is renewed during iteration when half of the timeout elapses
+        :param split_by_percentiles: shards are split by primary key percentiles instead of even primary key range
+            from min to max (must be used for not integer primary keys or unevenly distributed primary keys)
+        """
+        self._queryset = queryset
+        self._key = key
+        self._number_of_shards = number_of_shards
+        self._store_cursor_with_exception = store_cursor_with_exception
+        self._batch_size = batch_size
+        self._expiration = compute_expiration(expiration)
+        self._lease_timeout = lease_timeout
+        self._split_by_percentiles = split_by_percentiles
+        self._lease_id = uuid4().hex
+        self._shard_boundaries = None
+
+    def _get_cache_key(self, suffix):
+        return f'batch_queryset_iterator_{self._key}_{suffix}'
+
+    def _get_cache_timeout(self):
+        return (self._expiration - localtime()).total_seconds()
+
+    def _compute_shard_boundaries(self):
+        queryset = self._queryset.order_by('pk')
+        if self._split_by_percentiles:
+            count = queryset.count()
+            pks = queryset.values_list('pk', flat=True)
+            return [pks[count * i // self._number_of_shards] for i in range(1, self._number_of_shards)] if count else []
+        else:
+            pk_range = queryset.aggregate(min_pk=Min('pk'), max_pk=Max('pk'))
+            if pk_range['min_pk'] is None:
+                return []
+            range_size = pk_range['max_pk'] - pk_range['min_pk'] + 1
+            return [
+                pk_range['min_pk'] + range_size * i // self._number_of_shards
+                for i in range(1, self._number_of_shards)
+            ]
+
+    @property
+    def shard_boundaries(self):
+        """
+        Primary keys which split shards. Boundaries are computed only once and shared by workers via the cache.
+        """
+        if self._shard_boundaries is None:
+            cache_key = self._get_cache_key('shards')
+            shard_boundaries = cache.get(cache_key)
+            if shard_boundaries is None:
+                shard_boundaries = self._compute_shard_boundaries()
+                cache.add(cache_key, shard_boundaries, self._get_cache_timeout())
+                shard_boundaries = cache.get(cache_key, shard_boundaries)
+            self._shard_boundaries = shard_boundaries
+        return self._shard_boundaries
+
+    @property
+    def number_of_shards(self):
+        return len(self.shard_boundaries) + 1
+
+    def get_shard_queryset(self, shard):
+        shard_boundaries = self.shard_boundaries
+        queryset = self._queryset
+        if shard > 0:
+            queryset = queryset.filter(pk__gte=shard_boundaries[shard - 1])
+        if shard < len(shard_boundaries):
+            queryset = queryset.filter(pk__lt=shard_boundaries[shard])
+        return queryset
+
+    def get_shard_iterator(self, shard):
+        return BatchCachedQuerysetIterator(
+            self.get_shard_queryset(shard),
+            f'{self._key}_shard_{shard}',
+            store_cursor_with_exception=self._store_cursor_with_exception,
+            batch_size=self._batch_size,
+            expiration=self._expiration
+        )
+
+    def is_shard_finished(self, shard):
+        return bool(cache.get(self._get_cache_key(f'shard_{shard}_finished')))
+
+    def claim_shard(self):
+        """
+        Claims the first unfinished shard which is not claimed by another worker, returns None if there is no one.
+        """
+        for shard in range(self.number_of_shards):
+            if not self.is_shard_finished(shard) and cache.add(
+                    self._get_cache_key(f'shard_{shard}_lease'), self._lease_id, self._lease_timeout):
+                if self.is_shard_finished(shard):
+                    # Shard was finished by another worker before it was claimed
+                    self.release_shard(shard)
+                else:
+                    return shard
+        return None
+
+    def release_shard(self, shard):
+        lease_cache_key = self._get_cache_key(f'shard_{shard}_lease')
+        if cache.get(lease_cache_key) == self._lease_id:
+            cache.delete(lease_cache_key)
+
+    def _renew_shard_lease(self, shard):
+        """
+        Extends the shard lease if it is still held by this worker, returns False if the lease was lost.
+        """
+        lease_cache_key = self._get_cache_key(f'shard_{shard}_lease')
+        return cache.get(lease_cache_key) == self._lease_id and cache.touch(lease_cache_key, self._lease_timeout)
+
+    def iterate_claimed_shards(self, prefetch=False):
+        """
+        Claims shards one by one and iterates over all their objects until there is no unclaimed unfinished shard.
+        :param prefetch: next batch is loaded in a background thread while the current batch is processed, inside
+            an atomic block batches are loaded serially (the background thread would not see uncommitted data)
+        """
+        shard = self.claim_shard()
+        while shard is not None:
+            try:
+                iterator = self.get_shard_iterator(shard)
+                lease_renewed_at = time.monotonic()
+                for obj in iterator.iterate_all_batches(prefetch=prefetch):
+                    if time.monotonic() - lease_renewed_at >= self._lease_timeout / 2:
+                        if not self._renew_shard_lease(shard):
+                            # Lease expired and the shard can be processed by another worker
+                            break
+                        lease_renewed_at = time.monotonic()
+                    yield obj
+                else:
+                    cache.set(self._get_cache_key(f'shard_{shard}_finished'), True, self._get_cache_timeout())
+            finally:
+                self.release_shard(shard)
+            shard = self.claim_shard()
@@ -1,14 +1,39 @@
 import collections
-
 import copy
+import datetime
+import decimal
+import pickle
+import uuid
 
 from chamber.utils.decorators import singleton
+from chamber.utils.field_registry import get_field_registry
+
+
+IMMUTABLE_VALUE_TYPES = (
+    str, bytes, int, float, complex, decimal.Decimal, datetime.date, datetime.time, datetime.timedelta, uuid.UUID,
+    type(None)
+)
 
 
 def _should_exclude_field(field_name, fields, exclude):
     return (fields and field_name not in fields) or (exclude and field_name in exclude)
 
 
+def is_immutable_value(value):
+    return isinstance(value, IMMUTABLE_VALUE_TYPES)
+
+
+def copy_value(value, instance=None):
+    """
+    Returns a deep copy of a given value, immutable values are returned without copying. A given model instance
+    is not copied if it is referenced from the value (for example from FieldFile).
+    """
+    if is_immutable_value(value):
+        return value
+    else:
+        return copy.deepcopy(value, {} if instance is None else {id(instance): instance})
+
+
 def field_value_from_instance(field, instance):
     """
     Converts a model field to a dictionary
@@ -20,6 +45,66 @@ def field_value_from_instance(field, instance):
         return value
 
 
+class SerializedValue:
+    """
+    Compact snapshot of a mutable (dict or list) value. The value is stored in the pickled form and is deserialized
+    only if the initial value is required.
+    """
+
+    __slots__ = ('_data',)
+
+    def __init__(self, value):
+        self._data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @property
+    def value(self):
+        return pickle.loads(self._data)
+
+    def serialized_equals(self, value):
+        """
+        Compares only the pickled forms, equal values can have different pickled form (for example dicts with
+        different key order).
+        """
+        try:
+            return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL) == self._data
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return False
+
+    def equals(self, value):
+        return self.serialized_equals(value) or self.value == value
+
+    def __repr__(self):
+        return 'serialized({!r})'.format(self.value)
+
+
+class SnapshotStrategy:
+    """
+    Strategies how initial mutable values of the dynamic changed fields are stored:
+        * COPY - deep copy of the value is stored
+        * SERIALIZED - pickled value is stored, which is faster and requires less memory for large values, but
+          the initial value must be deserialized every time it is read
+    """
+
+    COPY = 'copy'
+    SERIALIZED = 'serialized'
+
+
+def serialize_value(value, instance=None):
+    """
+    Returns a serialized snapshot of a given dict or list value, other values are copied
+    """
+    if isinstance(value, (dict, list)):
+        try:
+            return SerializedValue(value)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            pass
+    return copy_value(value, instance)
+
+
+def deserialize_value(value):
+    return value.value if isinstance(value, SerializedValue) else value
+
+
 @singleton
 class UnknownSingleton:
 
@@ -47,17 +132,24 @@ Deferred = DeferredSingleton()
 
 
 def get_model_fields(model):
-    return [field for field in model._meta.concrete_fields]  # pylint: disable=W0212
+    return list(get_field_registry(model).concrete_fields)
 
 
 def get_model_field_names(model):
-    return [field.name for field in get_model_fields(model)]
+    return list(get_field_registry(model).concrete_field_names)
+
+
+def get_model_field_names_by_attname(model):
+    """
+    Returns a dict which maps field names and attnames of the model concrete fields to the field names
+    """
+    return dict(get_field_registry(model).field_names_by_attname)
 
 
 def unknown_model_fields_to_dict(instance, fields=None, exclude=None):
     return {
         field_name: Unknown
-        for field_name in get_model_field_names(instance)
+        for field_name in get_field_registry(instance).concrete_field_names
         if not _should_exclude_field(field_name, fields, exclude)
     }
 
@@ -67,8 +159,8 @@ def model_to_dict(instance, fields=None, exclude=None):
     The same implementation as django model_to_dict but editable fields are allowed
     """
     return {
-        field.name: copy.deepcopy(field_value_from_instance(field, instance))
-        for field in get_model_fields(instance)  # pylint: disable=W0212
+        field.name: copy_value(field.value_from_object(instance), instance)
+        for field in get_field_registry(instance).concrete_fields
         if not _should_exclude_field(field.name, fields, exclude)
     }
 
@@ -160,45 +252,163 @@ class ChangedFields:
 class DynamicChangedFields(ChangedFields):
     """
     Dynamic changed fields are changed with the instance changes.
+
+    By default all instance fields are compared with its initial values. If ``track_writes`` is set, the instance must
+    report every attribute assignment with the ``track_write`` method. Only written fields and fields with mutable
+    initial value (which can be changed without assignment) are compared then.
+
+    Initial mutable values are stored according to ``snapshot_strategy`` (see ``SnapshotStrategy``).
     """
 
-    def __init__(self, instance):
+    def __init__(self, instance, track_writes=False, snapshot_strategy=SnapshotStrategy.COPY):
         super().__init__(
             self._get_unknown_dict(instance)
         )
         self.instance = instance
+        self.track_writes = track_writes
+        self.snapshot_strategy = snapshot_strategy
+        self._fields = get_field_registry(instance).concrete_fields_by_name
+        self._field_names_by_attname = get_field_registry(instance).field_names_by_attname
+        self._written_fields = set()
+        self._volatile_fields = set(self._initial_dict.keys())
+        self._write_count = 0
+        self._static_changes = None
+        self._static_changes_write_count = None
 
     def _get_unknown_dict(self, instance):
         return unknown_model_fields_to_dict(instance)
 
+    @property
+    def initial_values(self):
+        return {field_name: deserialize_value(value) for field_name, value in self._initial_dict.items()}
+
+    def _snapshot_value(self, value):
+        if self.snapshot_strategy == SnapshotStrategy.SERIALIZED:
+            return serialize_value(value, self.instance)
+        else:
+            return copy_value(value, self.instance)
+
+    def _is_initial_value(self, field_name, value):
+        initial_value = self._initial_dict[field_name]
+        if isinstance(initial_value, SerializedValue):
+            return initial_value.equals(value)
+        else:
+            return initial_value == value
+
+    def track_write(self, attname):
+        field_name = self._field_names_by_attname.get(attname)
+        if field_name is not None:
+            self._written_fields.add(field_name)
+            self._write_count += 1
+
+    def _get_compared_field_names(self, fields=None):
+        if self.track_writes:
+            compared_field_names = self._written_fields | self._volatile_fields
+        else:
+            compared_field_names = self._initial_dict.keys()
+        return [
+            field_name for field_name in self._initial_dict
+            if field_name in compared_field_names and not _should_exclude_field(field_name, fields, None)
+        ]
+
+    def _get_current_value(self, field_name):
+        field = self._fields[field_name]
+        if field.attname not in self.instance.__dict__:
+            # Deferred field value is not loaded, therefore initial value is returned
+            return self._initial_dict[field_name]
+        else:
+            return field.value_from_object(self.instance)
+
     def get_current_values(self, fields=None):
-        deferred_values = {
-            field_name: value for field_name, value in self._initial_dict.items()
-            if field_name in self.instance.get_deferred_fields()
+        compared_field_names = self._get_compared_field_names(fields)
+        compared_field_name_set = set(compared_field_names)
+        current_values = {
+            field_name: deserialize_value(value) for field_name, value in self._initial_dict.items()
+            if field_name not in compared_field_name_set and not _should_exclude_field(field_name, fields, None)
         }
-        current_values = model_to_dict(
-            self.instance,
-            fields=fields,
-            exclude=set(deferred_values.keys())
-        )
-        current_values.update(deferred_values)
+        current_values.update({
+            field_name: copy_value(self._get_current_value(field_name), self.instance)
+            for field_name in compared_field_names
+        })
         return current_values
 
+    def _get_static_initial_values(self, current_values):
+        """
+        Returns initial values for the static changes. Serialized values equal to the current values (the serialized
+        forms are compared) are not deserialized, the current value is used instead.
+        """
+        return {
+            field_name: (
+                current_values[field_name]
+                if isinstance(value, SerializedValue) and value.serialized_equals(current_values[field_name])
+                else deserialize_value(value)
+            )
+            for field_name, value in self._initial_dict.items()
+        }
+
+    def get_diff(self, fields=None):
+        diff = {}
+        for field_name in self._get_compared_field_names(fields):
+            current_value = self._get_current_value(field_name)
+            if not self._is_initial_value(field_name, current_value):
+                diff[field_name] = ValueChange(
+                    deserialize_value(self._initial_dict[field_name]), copy_value(current_value, self.instance)
+                )
+        return diff
+
+    def _is_static_changes_valid(self):
+        """
+        Static changes are valid if no field was written and no mutable value was changed since they were created.
+        """
+        if (not self.track_writes
+                or self._static_changes is None
+                or self._static_changes_write_count != self._write_count):
+            return False
+
+        static_current_values = self._static_changes._current_dict  # pylint: disable=W0212
+        return all(
+            self._get_current_value(field_name) == static_current_values[field_name]
+            for field_name in self._volatile_fields
+        )
+
     def get_static_changes(self):
-        return StaticChangedFields(self.initial_values, self.current_values)
+        """
+        Returns immutable changed fields. With ``track_writes`` the same object is returned until the instance is
+        changed, therefore the changes are computed only once during the model save if the instance is not changed
+        by the pre save methods or dispatchers.
+        """
+        if not self._is_static_changes_valid():
+            current_values = self.current_values
+            self._static_changes = StaticChangedFields(self._get_static_initial_values(current_values), current_values)
+            self._static_changes_write_count = self._write_count
+        return self._static_changes
 
     def from_db(self, fields=None):
         if fields is None:
-            fields = {field_name for field_name, value in self._initial_dict.items() if value is not Deferred}
-
-        self._initial_dict.update(
-            model_to_dict(self.instance, fields=set(fields))
-        )
+            fields = {
+                field_name for field_name in (
+                    self._get_compared_field_names() if self.track_writes else self._initial_dict
+                )
+                if self._initial_dict[field_name] is not Deferred
+            }
+
+        if fields:
+            self._initial_dict.update({
+                field_name: self._snapshot_value(self._fields[field_name].value_from_object(self.instance))
+                for field_name in self._initial_dict if field_name in fields
+            })
 
         for field_name, value in self._initial_dict.items():
             if value is Unknown:
                 self._initial_dict[field_name] = Deferred
 
+        self._written_fields.difference_update(fields)
+        self._static_changes = None
+        self._volatile_fields = {
+            field_name for field_name, value in self._initial_dict.items()
+            if value is not Deferred and not is_immutable_value(value)
+        }
+
 
 class StaticChangedFields(ChangedFields):
     """
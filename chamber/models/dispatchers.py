@@ -3,8 +3,11 @@ import types
 from collections import defaultdict
 
 from django.core.exceptions import ImproperlyConfigured
+from django.utils.functional import cached_property
 
 from .handlers import BaseHandler
+from .instrumentation import get_handler_name, measure_stage
+from .signals import CREATED_DISPATCH_KEY, DISPATCH_STAGES
 
 
 class BaseDispatcher:
@@ -32,13 +35,38 @@ class BaseDispatcher:
         `instance` ... instance of the SmartModel where the handler is being called
         Some dispatchers require additional params to evaluate the handler can be dispatched,
         these are hidden in args and kwargs.
+        Dispatchers whose dispatch keys don't match the save are skipped without evaluation.
         """
-        if self._can_dispatch(instance, **kwargs):
-            self.handler(instance=instance, **kwargs)
+        if self._matches_dispatch_keys(**kwargs):
+            stage = DISPATCH_STAGES.get(kwargs.get('signal'), 'dispatch')
+            with measure_stage(instance.__class__, stage, lambda: get_handler_name(self)):
+                if self._can_dispatch(instance, **kwargs):
+                    self.handler(instance=instance, **kwargs)
 
     def _can_dispatch(self, instance, *args, **kwargs):
         raise NotImplementedError
 
+    def _matches_dispatch_keys(self, changed=None, changed_fields=None, **kwargs):
+        if self.dispatch_keys is None:
+            return True
+        elif not changed and CREATED_DISPATCH_KEY in self.dispatch_keys:
+            return True
+        else:
+            return bool(changed_fields) and not self.dispatch_keys.isdisjoint(changed_fields)
+
+    def get_dispatch_keys(self):
+        """
+        Returns keys of the changes (names or attnames of the changed fields and CREATED_DISPATCH_KEY) for which the
+        dispatcher can be dispatched. Dispatcher is evaluated only if the save matches one of the keys, None means
+        the dispatcher is evaluated on every save.
+        """
+        return None
+
+    @cached_property
+    def dispatch_keys(self):
+        dispatch_keys = self.get_dispatch_keys()
+        return frozenset(dispatch_keys) if dispatch_keys is not None else None
+
 
 class PropertyDispatcher(BaseDispatcher):
     """
@@ -68,6 +96,9 @@ class CreatedDispatcher(BaseDispatcher):
     def _can_dispatch(self, instance, changed, **kwargs):
         return not changed
 
+    def get_dispatch_keys(self):
+        return {CREATED_DISPATCH_KEY}
+
 
 class StateDispatcher(BaseDispatcher):
     """
@@ -90,3 +121,6 @@ class StateDispatcher(BaseDispatcher):
             self.field.get_attname() in changed_fields and
             getattr(instance, self.field.get_attname()) == self.field_value
         )
+
+    def get_dispatch_keys(self):
+        return {self.field.name, self.field.get_attname()}
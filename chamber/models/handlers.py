@@ -1,6 +1,9 @@
+from functools import partial
+
 from django.core.exceptions import ImproperlyConfigured
+from django.db.transaction import get_connection, on_commit
 
-from chamber.utils.transaction import pre_commit, UniquePreCommitCallable
+from chamber.utils.transaction import pre_commit, BatchPreCommitCallable, UniquePreCommitCallable
 from chamber.models.signals import dispatcher_post_save
 
 
@@ -42,22 +45,34 @@ class BaseHandler:
 class PreCommitHandler(BaseHandler):
     """
     Handler class that is used for performing on success operations.
+    If `executor` (chamber.utils.executors.BaseExecutor) is set, the handler is not performed before the commit, but
+    it is submitted to the executor after the commit.
     """
 
     signal = dispatcher_post_save
+    executor = None
 
-    def __init__(self, using=None, *args, **kwargs):
+    def __init__(self, using=None, *args, executor=None, **kwargs):
         self.using = using
+        if executor is not None:
+            self.executor = executor
         super().__init__(*args, **kwargs)
 
+    def _execute(self, func):
+        if self.executor is None:
+            func()
+        else:
+            on_commit(partial(self.executor.submit, func), using=self.using)
+
     def _handle(self, instance, **kwargs):
-        pre_commit(lambda: self.handle(instance, **kwargs), using=self.using)
+        pre_commit(lambda: self._execute(partial(self.handle, instance, **kwargs)), using=self.using)
 
 
 class InstanceOneTimePreCommitHandlerCallable(UniquePreCommitCallable):
     """
     Use this class to create on success caller that will be unique per instance and will be called only once per
-    instance.
+    instance. If the handler has set `is_batch`, all callables of the handler and the model are called together,
+    instances are loaded with `in_bulk` queries (chunked by `batch_size`) and passed to the handler `handle_batch`.
     """
 
     def __init__(self, handler, instance):
@@ -72,14 +87,118 @@ class InstanceOneTimePreCommitHandlerCallable(UniquePreCommitCallable):
         instance = self.kwargs_list[0]['instance']
         return hash((self.handler.__class__, instance.__class__, instance.pk))
 
-    def __call__(self):
+    def get_batch_key(self):
+        if self.handler.is_batch:
+            return self.handler.__class__, self.kwargs_list[0]['instance'].__class__
+        else:
+            return None
+
+    @classmethod
+    def _get_instances(cls, callables):
+        handler = callables[0].handler
+        model = callables[0].kwargs_list[0]['instance'].__class__
+        # Pk of the deleted instance is set to None
+        pks = [
+            callable.kwargs_list[0]['instance'].pk for callable in callables
+            if callable.kwargs_list[0]['instance'].pk is not None
+        ]
+        instances = []
+        for i in range(0, len(pks), handler.batch_size):
+            chunk_pks = pks[i:i + handler.batch_size]
+            instances_by_pk = model.objects.in_bulk(chunk_pks)
+            instances += [instances_by_pk[pk] for pk in chunk_pks if pk in instances_by_pk]
+        return instances
+
+    @classmethod
+    def _handle_batch(cls, callables):
+        callables[0].handler.handle_batch(instances=cls._get_instances(callables))
+
+    @classmethod
+    def call_batch(cls, callables):
+        callables[0].handler._execute(partial(cls._handle_batch, callables))
+
+    def _handle_instance(self):
         self.handler.handle(instance=self._get_instance())
 
+    def __call__(self):
+        self.handler._execute(self._handle_instance)
+
 
 class InstanceOneTimePreCommitHandler(PreCommitHandler):
     """
     Use this class to create handler that will be unique per instance and will be called only once per instance.
+    With set `is_batch` all instances are refreshed from the database with `in_bulk` queries (one per `batch_size`
+    instances) and handled by `handle_batch` method just before the commit. Deleted instances are skipped.
     """
 
+    is_batch = False
+    batch_size = 1000
+
+    def handle_batch(self, instances):
+        for instance in instances:
+            self.handle(instance=instance)
+
     def _handle(self, instance, **kwargs):
         pre_commit(InstanceOneTimePreCommitHandlerCallable(self, instance), using=self.using)
+
+
+class BatchPreCommitHandlerCallable(BatchPreCommitCallable):
+    """
+    Pre commit callable of one handled instance. Callables are not deduplicated, every handled instance is stored
+    and all callables of the handler are called together.
+    """
+
+    def __init__(self, handler, instance, **kwargs):
+        self.handler = handler
+        self.instance = instance
+        self.kwargs = kwargs
+
+    def get_batch_key(self):
+        return self.handler
+
+    @classmethod
+    def call_batch(cls, callables):
+        handler = callables[0].handler
+        for i in range(0, len(callables), handler.batch_size):
+            callables_chunk = callables[i:i + handler.batch_size]
+            handler._execute(partial(
+                handler.handle_batch,
+                instances=[callable.instance for callable in callables_chunk],
+                kwargs_list=[callable.kwargs for callable in callables_chunk]
+            ))
+
+    def handle(self):
+        self.call_batch([self])
+
+
+class BatchPreCommitHandler(PreCommitHandler):
+    """
+    Handler that accumulates handled instances with its kwargs (changed fields) during the transaction and handles
+    them together with `handle_batch` method just before the commit (in batches with maximal size `batch_size`).
+    With set `flush_on_size` the accumulated instances are handled immediately when their number reaches
+    `batch_size`, but only outside of savepoints (handled instances of a savepoint could be rolled back).
+    """
+
+    batch_size = 1000
+    flush_on_size = False
+
+    def __init__(self, using=None, *args, batch_size=None, flush_on_size=None, **kwargs):
+        super().__init__(using, *args, **kwargs)
+        if batch_size is not None:
+            self.batch_size = batch_size
+        if flush_on_size is not None:
+            self.flush_on_size = flush_on_size
+
+    def _handle(self, instance, **kwargs):
+        pre_commit(BatchPreCommitHandlerCallable(self, instance, **kwargs), using=self.using)
+
+        connection = get_connection(self.using)
+        if (self.flush_on_size and connection.in_atomic_block and not any(connection.savepoint_ids)
+                and connection.run_pre_commit.get_batch_length(self) >= self.batch_size):
+            connection.run_pre_commit.pop_batch(self)()
+
+    def handle(self, instance, **kwargs):
+        self.handle_batch([instance], [kwargs])
+
+    def handle_batch(self, instances, kwargs_list):
+        raise NotImplementedError
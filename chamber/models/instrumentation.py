@@ -0,0 +1,167 @@
+import time
+
+from contextlib import ContextDecorator, ExitStack
+from contextvars import ContextVar
+
+from django.db import connections
+
+
+_active_profiler = ContextVar('active_save_profiler', default=None)
+
+
+class StageStats:
+
+    __slots__ = ('count', 'total_time', 'max_time', 'query_count')
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.query_count = 0
+
+    def add(self, duration, query_count):
+        self.count += 1
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+        self.query_count += query_count
+
+
+class StageMeasurement:
+    """
+    Context manager which measures wall time and number of queries of one stage.
+    """
+
+    __slots__ = ('_profiler', '_model', '_stage', '_detail', '_start_time', '_start_query_count')
+
+    def __init__(self, profiler, model, stage, detail):
+        self._profiler = profiler
+        self._model = model
+        self._stage = stage
+        self._detail = detail
+
+    def __enter__(self):
+        self._start_query_count = self._profiler.query_count
+        self._start_time = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._profiler.record(
+            self._model, self._stage, self._detail,
+            time.perf_counter() - self._start_time,
+            self._profiler.query_count - self._start_query_count
+        )
+
+
+class NullStageMeasurement:
+
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+NULL_STAGE_MEASUREMENT = NullStageMeasurement()
+
+
+def get_handler_name(dispatcher):
+    handler = getattr(dispatcher, 'handler', dispatcher)
+    handler_name = getattr(handler, '__qualname__', handler.__class__.__qualname__)
+    return f'{dispatcher.__class__.__name__}({handler_name})' if handler is not dispatcher else handler_name
+
+
+def measure_stage(model, stage, detail=None):
+    """
+    Returns context manager which measures the stage of the model save if the save profiler is active.
+    `detail` can be a callable which is evaluated only if the profiler is active.
+    """
+    profiler = _active_profiler.get()
+    if profiler is None:
+        return NULL_STAGE_MEASUREMENT
+    return StageMeasurement(profiler, model, stage, detail() if callable(detail) else detail)
+
+
+class SaveProfiler(ContextDecorator):
+    """
+    Opt-in instrumentation of the SmartModel save. Inside the context manager (or decorated function) wall time and
+    number of queries of the save stages (pre save, cleaning, dispatchers, save simple, post save) are recorded and
+    aggregated per model. Statistics can be formatted as a report or exported to a metrics sink (callable which gets
+    list of the statistics) when the profiler exits.
+
+    Eq
+        with SaveProfiler(sink=send_to_statsd) as profiler:
+            User.objects.create(...)
+        print(profiler.format_report())
+    """
+
+    def __init__(self, sink=None, using=None):
+        """
+        :param sink: callable which is called with the statistics (result of the `get_stats`) on exit
+        :param using: aliases of the databases whose queries are counted, all databases are used by default
+        """
+        self.sink = sink
+        self.using = using
+        self.query_count = 0
+        self._stats = {}
+        self._exit_stack = None
+        self._token = None
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.query_count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._exit_stack = ExitStack()
+        aliases = self.using if self.using is not None else list(connections)
+        for alias in ([aliases] if isinstance(aliases, str) else aliases):
+            self._exit_stack.enter_context(connections[alias].execute_wrapper(self._count_query))
+        self._token = _active_profiler.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _active_profiler.reset(self._token)
+        self._exit_stack.close()
+        if self.sink is not None:
+            self.sink(self.get_stats())
+
+    def record(self, model, stage, detail, duration, query_count):
+        key = (model._meta.label, stage, detail)
+        stage_stats = self._stats.get(key)
+        if stage_stats is None:
+            stage_stats = self._stats[key] = StageStats()
+        stage_stats.add(duration, query_count)
+
+    def get_stats(self):
+        """
+        Returns list of the aggregated statistics (dicts) ordered by the total time.
+        """
+        return sorted(
+            (
+                {
+                    'model': model_label,
+                    'stage': stage,
+                    'detail': detail,
+                    'count': stage_stats.count,
+                    'total_time': stage_stats.total_time,
+                    'max_time': stage_stats.max_time,
+                    'query_count': stage_stats.query_count,
+                }
+                for (model_label, stage, detail), stage_stats in self._stats.items()
+            ),
+            key=lambda stats: stats['total_time'],
+            reverse=True
+        )
+
+    def format_report(self):
+        lines = [
+            '{:<30} {:<20} {:<50} {:>8} {:>12} {:>12} {:>8}'.format(
+                'model', 'stage', 'detail', 'count', 'total ms', 'max ms', 'queries'
+            )
+        ]
+        for stats in self.get_stats():
+            lines.append('{:<30} {:<20} {:<50} {:>8} {:>12.3f} {:>12.3f} {:>8}'.format(
+                stats['model'], stats['stage'], stats['detail'] or '', stats['count'],
+                stats['total_time'] * 1000, stats['max_time'] * 1000, stats['query_count']
+            ))
+        return '\n'.join(lines)
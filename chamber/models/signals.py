@@ -1,5 +1,15 @@
 from django.dispatch import Signal
 
 
+# Dispatch key of dispatchers which can be dispatched only for a created instance
+CREATED_DISPATCH_KEY = '__created__'
+
+
 dispatcher_pre_save = Signal()
 dispatcher_post_save = Signal()
+
+# Names of the save stages measured by the save profiler
+DISPATCH_STAGES = {
+    dispatcher_pre_save: 'dispatch_pre_save',
+    dispatcher_post_save: 'dispatch_post_save',
+}
@@ -1,20 +1,49 @@
 import codecs
+import weakref
 
+from django.apps.registry import Apps
+from django.core.signals import setting_changed
 from django.db.models import Model
 from django.db.models.fields import Field
 from django.db.transaction import get_connection, Atomic
+from django.dispatch import receiver
 
 from chamber.utils import remove_accent
+from chamber.utils.field_registry import clear_field_registries
+from chamber.utils.transaction import PreCommitQueue
 
 
 class OptionsLazy:
+    """
+    Descriptor that returns options of the model class. Options are created only once per model class, cache can be
+    cleared with the clear_cache method (it is cleared automatically when Django settings are changed in tests).
+    Model classes are referenced weakly, therefore options do not prevent dynamically created models from being
+    garbage collected.
+    """
+
+    instances = weakref.WeakSet()
 
     def __init__(self, name, klass):
         self.name = name
         self.klass = klass
+        self._options = weakref.WeakKeyDictionary()
+        self.instances.add(self)
 
     def __get__(self, instance=None, owner=None):
-        return self.klass(owner)
+        try:
+            return self._options[owner]
+        except KeyError:
+            options = self._options[owner] = self.klass(owner)
+            return options
+
+    def clear_cache(self):
+        self._options = weakref.WeakKeyDictionary()
+
+
+@receiver(setting_changed)
+def clear_options_cache(**kwargs):
+    for options_lazy in OptionsLazy.instances:
+        options_lazy.clear_cache()
 
 
 class OptionsBase(type):
@@ -33,22 +62,31 @@ class Options(metaclass=OptionsBase):
     model_class = None
 
     def __init__(self, model):
-        self.model = model
+        self._model_ref = weakref.ref(model)
 
+        metas = self._get_metas(model)
         for key, default_value in self._get_attributes(model).items():
-            setattr(self, key, self._getattr(key, default_value))
+            setattr(self, key, self._getattr(key, default_value, metas))
+
+    @property
+    def model(self):
+        return self._model_ref()
 
     def _get_attributes(self, model):
         return self.attributes
 
-    def _getattr(self, name, default_value):
-        meta_models = [b for b in self.model.__mro__ if issubclass(b, Model)]
-        for model in meta_models:
-            meta = getattr(model, self.meta_class_name, None)
-            if meta:
-                value = getattr(meta, name, None)
-                if value is not None:
-                    return value
+    def _get_metas(self, model):
+        meta_models = [b for b in model.__mro__ if issubclass(b, Model)]
+        return [
+            meta for meta in (getattr(meta_model, self.meta_class_name, None) for meta_model in meta_models) if meta
+        ]
+
+    def _getattr(self, name, default_value, metas=None):
+        metas = self._get_metas(self.model) if metas is None else metas
+        for meta in metas:
+            value = getattr(meta, name, None)
+            if value is not None:
+                return value
         return default_value
 
 
@@ -89,7 +127,7 @@ def atomic_pre_commit_enter(self):
     connection = get_connection(self.using)
     # empty savepoints means top level atomic block
     if not connection.savepoint_ids:
-        connection.run_pre_commit = []
+        connection.run_pre_commit = PreCommitQueue()
 
 
 def atomic_pre_commit_exit(self, exc_type, exc_value, traceback):
@@ -99,23 +137,29 @@ def atomic_pre_commit_exit(self, exc_type, exc_value, traceback):
         if not connection.savepoint_ids:
             # No exception and no rollback, pre_commit hooks can be performed on top level atomic block exit function
             while connection.run_pre_commit:
-                sids, callable_hash, func = connection.run_pre_commit.pop(0)
-                func()
+                connection.run_pre_commit.popleft()()
+        elif connection.savepoint_ids[-1]:
+            connection.run_pre_commit.release_savepoint(connection.savepoint_ids[-1])
     else:
         if connection.savepoint_ids:
             sid = connection.savepoint_ids[-1]
             if sid:
                 # only current sid is removed from pre commit list
-                connection.run_pre_commit = [
-                    (sids, callable_hash, func)
-                    for (sids, callable_hash, func) in connection.run_pre_commit if sid not in sids
-                ]
+                connection.run_pre_commit.rollback_savepoint(sid)
         else:
             # top level atomic block rollback
-            connection.run_pre_commit = []
+            connection.run_pre_commit = PreCommitQueue()
     self._exit_chamber_patch_(exc_type, exc_value, traceback)
 
 
+def apps_clear_cache(self):
+    self._clear_cache_chamber_patch_()
+    clear_field_registries()
+
+
+Apps._clear_cache_chamber_patch_ = Apps.clear_cache
+Apps.clear_cache = apps_clear_cache
+
 Atomic._enter_chamber_patch_ = Atomic.__enter__
 Atomic._exit_chamber_patch_ = Atomic.__exit__
 Atomic.__enter__ = atomic_pre_commit_enter
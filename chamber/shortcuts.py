@@ -1,10 +1,16 @@
+from collections import namedtuple
 from datetime import date, datetime, time
+from itertools import islice
 
+from django.db import transaction
+from django.db.models import QuerySet
 from django.http.response import Http404
 from django.shortcuts import _get_queryset
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 
+from chamber.utils.field_registry import get_field_registry
+
 
 def get_object_or_none(klass, *args, **kwargs):
     queryset = _get_queryset(klass)
@@ -52,18 +58,14 @@ def exclude_by_date(klass, **kwargs):
 
 
 def get_model_field_names(model):
-    return {
-        field.name for field in model._meta.fields
-    } | {
-        field.attname for field in model._meta.fields
-    } | {'pk'}
+    return set(get_field_registry(model).settable_field_names)
 
 
 def change(obj, **changed_fields):
     """
     Changes a given `changed_fields` on object and returns changed object.
     """
-    obj_field_names = get_model_field_names(obj)
+    obj_field_names = get_field_registry(obj).settable_field_names
 
     for field_name, value in changed_fields.items():
         if field_name not in obj_field_names:
@@ -73,7 +75,7 @@ def change(obj, **changed_fields):
 
 
 def get_update_fields(obj, **changed_fields):
-    obj_field_names = get_model_field_names(obj)
+    obj_field_names = get_field_registry(obj).settable_field_names
     update_fields = []
     for field_name, value in changed_fields.items():
         if field_name not in obj_field_names:
@@ -109,16 +111,71 @@ def bulk_change(iterable, **changed_fields):
     return [change(obj, **changed_fields) for obj in iterable]
 
 
-def bulk_change_and_save(iterable, update_only_changed_fields=False, save_kwargs=None, **changed_fields):
+def _bulk_update(objs, update_only_changed_fields=False, save_kwargs=None, **changed_fields):
+    """
+    Saves changed stored objects of the same model in batches. SmartModel objects are saved with
+    `smart_bulk_update`, other models with Django `bulk_update`.
+    """
+    from chamber.models import SmartModel
+
+    model = objs[0].__class__
+    save_kwargs = dict(save_kwargs) if save_kwargs is not None else {}
+    update_only_changed_fields = save_kwargs.pop('update_only_changed_fields', False) or update_only_changed_fields
+    manager = model._default_manager.db_manager(save_kwargs.pop('using', None))
+    if issubclass(model, SmartModel):
+        manager.smart_bulk_update(objs, update_only_changed_fields=update_only_changed_fields, **save_kwargs)
+    else:
+        if update_only_changed_fields:
+            update_fields = {model._meta.get_field(field_name) for field_name in changed_fields if field_name != 'pk'}
+            # Auto now fields are updated by the model save method even if they are not changed
+            update_fields |= {
+                field for field in get_field_registry(model).concrete_fields if getattr(field, 'auto_now', False)
+            }
+        else:
+            update_fields = set(get_field_registry(model).concrete_fields)
+        update_fields = [
+            field for field in get_field_registry(model).concrete_fields
+            if field in update_fields and not field.primary_key
+        ]
+        if update_fields:
+            # Prepare values (e.g. auto now fields) the same way as the model save method
+            for obj in objs:
+                for field in update_fields:
+                    field.pre_save(obj, False)
+            manager.bulk_update(objs, [field.name for field in update_fields])
+
+
+def bulk_change_and_save(iterable, update_only_changed_fields=False, save_kwargs=None, bulk=False,
+                         **changed_fields):
     """
     Changes a given `changed_fields` on each object in a given `iterable`, saves objects
     and returns the changed objects.
+    If `bulk` is set, stored objects are updated in the database in batches (one query per batch instead of one query
+    per object).
     """
-    return [
-        change_and_save(obj, update_only_changed_fields=update_only_changed_fields, save_kwargs=save_kwargs,
-                        **changed_fields)
-        for obj in iterable
-    ]
+    if not bulk:
+        return [
+            change_and_save(obj, update_only_changed_fields=update_only_changed_fields, save_kwargs=save_kwargs,
+                            **changed_fields)
+            for obj in iterable
+        ]
+
+    objs = list(iterable)
+    objs_by_model = {}
+    for obj in objs:
+        if obj.pk is None or obj._state.adding:
+            change_and_save(obj, update_only_changed_fields=update_only_changed_fields, save_kwargs=save_kwargs,
+                            **changed_fields)
+        else:
+            change(obj, **changed_fields)
+            objs_by_model.setdefault(obj.__class__, []).append(obj)
+
+    for model_objs in objs_by_model.values():
+        _bulk_update(
+            model_objs, update_only_changed_fields=update_only_changed_fields, save_kwargs=save_kwargs,
+            **changed_fields
+        )
+    return objs
 
 
 def bulk_save(iterable):
@@ -126,3 +183,95 @@ def bulk_save(iterable):
     Saves a objects in a given `iterable`.
     """
     return [obj.save() for obj in iterable]
+
+
+StreamSaveResult = namedtuple('StreamSaveResult', ('saved_count', 'failed_count', 'failed_pks'))
+
+
+def _iterate_in_chunks(iterable, chunk_size):
+    """
+    Yields lists of objects with the maximal length `chunk_size`. Querysets are iterated without result cache.
+    """
+    iterator = iterable.iterator(chunk_size=chunk_size) if isinstance(iterable, QuerySet) else iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _stream_save(iterable, save_chunk, chunk_size, ignore_errors):
+    using = iterable.db if isinstance(iterable, QuerySet) else None
+    ignore_errors = () if ignore_errors is None else ignore_errors
+    saved_count, failed_pks = 0, []
+    for chunk in _iterate_in_chunks(iterable, chunk_size):
+        try:
+            with transaction.atomic(using=using):
+                chunk_failed_pks = save_chunk(chunk, using, ignore_errors)
+        except ignore_errors:
+            chunk_failed_pks = [obj.pk for obj in chunk]
+        saved_count += len(chunk) - len(chunk_failed_pks)
+        failed_pks += chunk_failed_pks
+    return StreamSaveResult(saved_count, len(failed_pks), failed_pks)
+
+
+def _save_objs(objs, save_obj, using, ignore_errors):
+    """
+    Saves objects one by one, objects which raised one of `ignore_errors` are rolled back to its savepoint and its
+    primary keys are returned.
+    """
+    failed_pks = []
+    for obj in objs:
+        if ignore_errors:
+            try:
+                with transaction.atomic(using=using):
+                    save_obj(obj)
+            except ignore_errors:
+                failed_pks.append(obj.pk)
+        else:
+            save_obj(obj)
+    return failed_pks
+
+
+def stream_change_and_save(iterable, update_only_changed_fields=False, save_kwargs=None, bulk=False,
+                           chunk_size=1000, ignore_errors=None, **changed_fields):
+    """
+    Streaming variant of `bulk_change_and_save`. Objects are loaded (querysets with `iterator`), changed and saved
+    in chunks, every chunk is saved in its own transaction. Objects are not returned to keep memory usage flat,
+    the function returns StreamSaveResult with number of saved objects and primary keys of failed objects.
+    Failed objects are objects which raised one of `ignore_errors` exceptions (the chunk is failed in the bulk mode),
+    other exceptions are raised.
+    """
+    def save_chunk(chunk, using, ignore_errors):
+        if bulk:
+            bulk_change_and_save(
+                chunk, update_only_changed_fields=update_only_changed_fields, save_kwargs=save_kwargs, bulk=True,
+                **changed_fields
+            )
+            return []
+        else:
+            return _save_objs(
+                chunk,
+                lambda obj: change_and_save(
+                    obj, update_only_changed_fields=update_only_changed_fields,
+                    save_kwargs=dict(save_kwargs) if save_kwargs is not None else None, **changed_fields
+                ),
+                using,
+                ignore_errors
+            )
+
+    return _stream_save(iterable, save_chunk, chunk_size, ignore_errors)
+
+
+def stream_save(iterable, chunk_size=1000, ignore_errors=None):
+    """
+    Streaming variant of `bulk_save`. Objects are loaded (querysets with `iterator`) and saved in chunks, every chunk
+    is saved in its own transaction. The function returns StreamSaveResult with number of saved objects and primary
+    keys of failed objects (objects which raised one of `ignore_errors` exceptions).
+    """
+    return _stream_save(
+        iterable,
+        lambda chunk, using, ignore_errors: _save_objs(chunk, lambda obj: obj.save(), using, ignore_errors),
+        chunk_size,
+        ignore_errors
+    )
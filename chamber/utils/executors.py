@@ -0,0 +1,140 @@
+import logging
+import threading
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorQueueFull(Exception):
+    pass
+
+
+def run_job(func):
+    """
+    Runs the job outside of the request, database connections of the worker are closed if they are unusable or
+    obsolete.
+    """
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+class ExecutorMetrics:
+    """
+    Thread safe counters of the executor jobs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def increment(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @property
+    def pending(self):
+        return self.submitted - self.completed - self.failed
+
+    def as_dict(self):
+        return {
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'pending': self.pending,
+        }
+
+
+class BaseExecutor:
+    """
+    Executor of jobs (callables without arguments) with bounded number of pending jobs. If the queue is full,
+    submit waits for a free slot (backpressure) `timeout` seconds (None means forever) or raises ExecutorQueueFull
+    immediately if `block` is False.
+    """
+
+    def __init__(self, max_queue_size=1000, block=True, timeout=None):
+        self.max_queue_size = max_queue_size
+        self.block = block
+        self.timeout = timeout
+        self.metrics = ExecutorMetrics()
+        self._slots = threading.BoundedSemaphore(max_queue_size)
+
+    def _acquire_slot(self):
+        if not self._slots.acquire(blocking=self.block, timeout=self.timeout if self.block else None):
+            self.metrics.increment('rejected')
+            raise ExecutorQueueFull(f'Executor queue is full (max queue size is {self.max_queue_size})')
+
+    def _release_slot(self, is_failed=False):
+        self.metrics.increment('failed' if is_failed else 'completed')
+        self._slots.release()
+
+    def submit(self, func):
+        self._acquire_slot()
+        self.metrics.increment('submitted')
+        self._submit(func)
+
+    def _submit(self, func):
+        raise NotImplementedError
+
+
+class PoolExecutor(BaseExecutor):
+    """
+    Executor which runs jobs in the concurrent.futures executor (ThreadPoolExecutor by default). ProcessPoolExecutor
+    can be used too, but jobs must be picklable.
+    """
+
+    def __init__(self, pool=None, max_queue_size=1000, block=True, timeout=None):
+        super().__init__(max_queue_size=max_queue_size, block=block, timeout=timeout)
+        self.pool = pool if pool is not None else ThreadPoolExecutor()
+
+    def _job_done(self, future):
+        is_failed = future.exception() is not None
+        if is_failed:
+            logger.error('Executor job failed', exc_info=future.exception())
+        self._release_slot(is_failed)
+
+    def _submit(self, func):
+        try:
+            future = self.pool.submit(run_job, func)
+        except Exception:
+            self._release_slot(is_failed=True)
+            raise
+        future.add_done_callback(self._job_done)
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
+
+
+class LocalQueueExecutor(BaseExecutor):
+    """
+    Executor which only stores jobs in the local queue. Jobs are run with `run_pending` method (for example by a
+    worker loop or tests).
+    """
+
+    def __init__(self, max_queue_size=1000, block=False, timeout=None):
+        super().__init__(max_queue_size=max_queue_size, block=block, timeout=timeout)
+        self.queue = deque()
+
+    def _submit(self, func):
+        self.queue.append(func)
+
+    def run_pending(self):
+        while self.queue:
+            func = self.queue.popleft()
+            try:
+                func()
+            except Exception:
+                logger.exception('Executor job failed')
+                self._release_slot(is_failed=True)
+            else:
+                self._release_slot()
@@ -0,0 +1,45 @@
+from weakref import WeakKeyDictionary
+
+
+_field_registries = WeakKeyDictionary()
+
+
+class FieldRegistry:
+    """
+    Precomputed field indexes of one model. Values are shared and must not be modified.
+    """
+
+    def __init__(self, model):
+        opts = model._meta
+        self.pk_name = opts.pk.name
+        self.pk_attname = opts.pk.attname
+        self.concrete_fields = tuple(opts.concrete_fields)
+        self.concrete_field_names = tuple(field.name for field in self.concrete_fields)
+        self.concrete_attnames = tuple(field.attname for field in self.concrete_fields)
+        self.concrete_fields_by_name = {field.name: field for field in self.concrete_fields}
+        self.field_names_by_attname = {
+            **{field.name: field.name for field in self.concrete_fields},
+            **{field.attname: field.name for field in self.concrete_fields},
+        }
+        self.settable_field_names = frozenset(
+            {field.name for field in opts.fields} | {field.attname for field in opts.fields} | {'pk'}
+        )
+        self.auto_now_field_names = tuple(
+            field.name for field in opts.fields if getattr(field, 'auto_now', False)
+        )
+
+
+def get_field_registry(model):
+    """
+    Returns field registry of the model (or model instance). Registry is computed only once per model class
+    and is invalidated with the app registry cache.
+    """
+    model = model if isinstance(model, type) else model.__class__
+    field_registry = _field_registries.get(model)
+    if field_registry is None:
+        field_registry = _field_registries[model] = FieldRegistry(model)
+    return field_registry
+
+
+def clear_field_registries():
+    _field_registries.clear()
@@ -1,5 +1,8 @@
 import logging
 
+from collections import deque
+from functools import partial
+
 from django.db import transaction, DEFAULT_DB_ALIAS
 from django.db.transaction import get_connection
 from django.db.transaction import TransactionManagementError
@@ -10,15 +13,119 @@ from contextlib import contextmanager
 logger = logging.getLogger(__name__)
 
 
+class PreCommitEntry:
+
+    __slots__ = ('func_hash', 'batch_key', 'func', 'is_removed')
+
+    def __init__(self, func_hash, batch_key, func):
+        self.func_hash = func_hash
+        self.batch_key = batch_key
+        self.func = func
+        self.is_removed = False
+
+
+class PreCommitQueue:
+    """
+    Queue of pre commit callables of one connection. Callables are stored in a deque, unique callables are indexed
+    by its hash and every callable is indexed by savepoints which were active when the callable was added.
+    Therefore adding, popping and deduplication have constant time complexity and savepoint rollback touches only
+    callables added inside the savepoint (removed callables are only marked and skipped while popping).
+    Batch callables with the same batch key are popped together and called with one `call_batch` call.
+    """
+
+    def __init__(self):
+        self._queue = deque()
+        self._unique_entries = {}
+        self._batch_entries = {}
+        self._batch_lengths = {}
+        self._savepoint_entries = {}
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    def __iter__(self):
+        return (entry.func for entry in self._queue if not entry.is_removed)
+
+    def add(self, func, savepoint_ids=()):
+        func_hash = hash(func) if isinstance(func, UniquePreCommitCallable) else None
+        if func_hash is not None and func_hash in self._unique_entries:
+            return
+
+        batch_key = func.get_batch_key() if isinstance(func, BatchPreCommitCallable) else None
+        entry = PreCommitEntry(func_hash, batch_key, func)
+        self._queue.append(entry)
+        self._length += 1
+        if func_hash is not None:
+            self._unique_entries[func_hash] = entry
+        if batch_key is not None:
+            self._batch_entries.setdefault(batch_key, []).append(entry)
+            self._batch_lengths[batch_key] = self._batch_lengths.get(batch_key, 0) + 1
+        for sid in savepoint_ids:
+            if sid:
+                self._savepoint_entries.setdefault(sid, []).append(entry)
+
+    def _remove_entry(self, entry):
+        entry.is_removed = True
+        self._length -= 1
+        if entry.func_hash is not None:
+            del self._unique_entries[entry.func_hash]
+        if entry.batch_key is not None:
+            self._batch_lengths[entry.batch_key] -= 1
+            if not self._batch_lengths[entry.batch_key]:
+                del self._batch_lengths[entry.batch_key]
+
+    def popleft(self):
+        entry = self._queue.popleft()
+        while entry.is_removed:
+            entry = self._queue.popleft()
+        if entry.batch_key is None:
+            self._remove_entry(entry)
+            return entry.func
+        else:
+            return self.pop_batch(entry.batch_key)
+
+    def get_batch_length(self, batch_key):
+        return self._batch_lengths.get(batch_key, 0)
+
+    def pop_batch(self, batch_key):
+        """
+        Removes all callables with the batch key from the queue and returns function which calls them.
+        """
+        batch_entries = [
+            batch_entry for batch_entry in self._batch_entries.pop(batch_key, ()) if not batch_entry.is_removed
+        ]
+        for batch_entry in batch_entries:
+            self._remove_entry(batch_entry)
+        return (
+            partial(batch_entries[0].func.call_batch, [batch_entry.func for batch_entry in batch_entries])
+            if batch_entries else lambda: None
+        )
+
+    def rollback_savepoint(self, sid):
+        """
+        Removes callables which were added inside the savepoint.
+        """
+        for entry in self._savepoint_entries.pop(sid, ()):
+            if not entry.is_removed:
+                self._remove_entry(entry)
+
+    def release_savepoint(self, sid):
+        """
+        Callables added inside the released savepoint are kept, only the savepoint index is removed.
+        """
+        self._savepoint_entries.pop(sid, None)
+
+
 def pre_commit(func, using=None):
     connection = get_connection(using)
 
     if connection.in_atomic_block:
         # Transaction in progress; save for execution on commit.
-        func_hash = hash(func) if isinstance(func, UniquePreCommitCallable) else None
-        if (func_hash is None
-                or func_hash not in {func_hash for sids, func_hash, func in connection.run_pre_commit}):
-            connection.run_pre_commit.append((set(connection.savepoint_ids), func_hash, func))
+        connection.run_pre_commit.add(func, connection.savepoint_ids)
 
     elif not connection.get_autocommit():
         raise TransactionManagementError('pre_commit() cannot be used in manual transaction management')
@@ -71,7 +178,32 @@ def in_atomic_block(using=None):
     return connection.in_atomic_block
 
 
-class UniquePreCommitCallable:
+class BatchPreCommitCallable:
+    """
+    Pre commit callable which can be called together with other callables with the same batch key.
+    """
+
+    def get_batch_key(self):
+        """
+        Callables with the same batch key (which is not None) are called together with one `call_batch` call
+        when the first of them is popped from the pre commit queue. The method returns None by default, therefore
+        callables are called one by one.
+        """
+        return None
+
+    @classmethod
+    def call_batch(cls, callables):
+        for callable in callables:
+            callable()
+
+    def __call__(self):
+        self.handle()
+
+    def handle(self):
+        raise NotImplementedError
+
+
+class UniquePreCommitCallable(BatchPreCommitCallable):
     """
     One time callable class that is used for performing on success operations.
     Handler is callable only once, but data of all calls are stored inside list (kwargs_list).
@@ -101,9 +233,3 @@ class UniquePreCommitCallable:
 
     def _get_kwargs(self):
         return self.kwargs_list[-1]
-
-    def __call__(self):
-        self.handle()
-
-    def handle(self):
-        raise NotImplementedError
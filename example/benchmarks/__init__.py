@@ -0,0 +1,64 @@
+"""
+Reproducible benchmarks of the chamber optimizations. Benchmarks run against the test database of the example project
+(SQLite by default), run them from the example directory, e.g.
+
+    python -m benchmarks.changed_fields_snapshot
+"""
+import os
+import sys
+import time
+
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    """
+    Configures Django with the example project settings and creates the test database.
+    """
+    sys.path[:0] = [
+        os.path.dirname(PROJECT_DIR), PROJECT_DIR, os.path.join(PROJECT_DIR, 'dj', 'apps'),
+        os.path.join(PROJECT_DIR, 'dj', 'libs')
+    ]
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dj.settings.settings')
+
+    import django
+    django.setup()
+
+    from django.db import connection
+    connection.creation.create_test_db(verbosity=0)
+
+
+def timeit(label, func, number=1000):
+    """
+    Prints average wall time of the function call.
+    """
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    duration = (time.perf_counter() - start) / number
+    print('{:60s} {:12.1f} us'.format(label, duration * 1e6))
+    return duration
+
+
+class QueryCounter:
+    """
+    Context manager which counts executed queries of the default database.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        from django.db import connection
+
+        self._context_manager = connection.execute_wrapper(self._count_query)
+        self._context_manager.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self._context_manager.__exit__(*args)
@@ -0,0 +1,62 @@
+"""
+Number of statements and wall time of bulk_change_and_save with objects grouped by the changed fields signature.
+Every object changes name and number, 5% of objects change the datetime too. The union of the changed columns
+(previous behaviour of the bulk mode) is emulated by one update group with all changed fields.
+
+    python -m benchmarks.bulk_change_and_save_grouping
+"""
+import random
+import time
+
+from unittest.mock import patch
+
+from benchmarks import QueryCounter, setup_django
+
+
+def get_union_bulk_update_groups(self, objs, changed_fields_list, update_only_changed_fields):
+    from chamber.utils.field_registry import get_field_registry
+
+    update_field_names = set()
+    for obj, changed_fields in zip(objs, changed_fields_list):
+        update_field_names.update(obj._get_update_fields(changed_fields))  # pylint: disable=W0212
+    return [(objs, [
+        field for field in get_field_registry(self.model).concrete_fields if field.name in update_field_names
+    ])]
+
+
+def run(label, bulk, number_of_objects=2000):
+    from django.utils import timezone
+
+    from chamber.shortcuts import bulk_change_and_save
+    from test_chamber.models import DiffModel
+
+    random.seed(0)
+    objs = list(DiffModel.objects.order_by('pk')[:number_of_objects])
+    for obj in objs:
+        obj.number += 1
+        if random.random() < 0.05:
+            obj.datetime = timezone.now()
+
+    with QueryCounter() as query_counter:
+        start = time.perf_counter()
+        bulk_change_and_save(objs, update_only_changed_fields=True, bulk=bulk, name=f'name{random.randint(0, 9)}')
+        duration = time.perf_counter() - start
+    print('{:40s} {:6d} statements {:10.1f} ms'.format(label, query_counter.count, duration * 1000))
+
+
+if __name__ == '__main__':
+    setup_django()
+
+    from django.utils import timezone
+
+    from chamber.models.base import SmartQuerySetMixin
+    from test_chamber.models import DiffModel
+
+    DiffModel.objects.bulk_create([
+        DiffModel(name='name', datetime=timezone.now(), number=i) for i in range(2000)
+    ])
+
+    run('per object save (bulk=False)', bulk=False)
+    with patch.object(SmartQuerySetMixin, '_get_bulk_update_groups', get_union_bulk_update_groups):
+        run('bulk, union of changed columns', bulk=True)
+    run('bulk, grouped by changed fields', bulk=True)
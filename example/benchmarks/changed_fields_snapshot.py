@@ -0,0 +1,61 @@
+"""
+Memory and load time of the changed fields snapshot strategies for models with large JSON values.
+
+    python -m benchmarks.changed_fields_snapshot
+"""
+import gc
+import time
+import tracemalloc
+
+from benchmarks import setup_django
+
+
+def run(strategy, number_of_objects=1000, payload_size=200):
+    from django.utils import timezone
+
+    from chamber.patch import clear_options_cache
+    from test_chamber.models import DiffModel
+
+    class SmartMeta:
+        changed_fields_snapshot_strategy = strategy
+
+    DiffModel.SmartMeta = SmartMeta
+    clear_options_cache()
+    try:
+        payload = {
+            'items': [
+                {'sku': 'SKU-{}'.format(i), 'qty': i, 'tags': ['a', 'b', 'c'], 'price': i * 1.5}
+                for i in range(payload_size)
+            ]
+        }
+        DiffModel.objects.all().delete()
+        DiffModel.objects.bulk_create([
+            DiffModel(name='name', datetime=timezone.now(), number=i, data=payload) for i in range(number_of_objects)
+        ])
+        list(DiffModel.objects.all())
+        gc.collect()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        objs = list(DiffModel.objects.all())
+        load_time = time.perf_counter() - start
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        for obj in objs:
+            obj.change_and_save(number=obj.number + 1, update_only_changed_fields=True)
+        save_time = time.perf_counter() - start
+
+        print('{:12s} {:10.0f} bytes/instance  load {:8.1f} ms  save {:8.1f} ms'.format(
+            strategy, size / len(objs), load_time * 1000, save_time * 1000
+        ))
+    finally:
+        del DiffModel.SmartMeta
+        clear_options_cache()
+
+
+if __name__ == '__main__':
+    setup_django()
+    run('copy')
+    run('serialized')
@@ -0,0 +1,42 @@
+"""
+Wall time of distinct() and fast_distinct() strategies for querysets with multi-valued joins. Every object has
+5 related objects and the reverse relation is joined twice, therefore every object is returned 25 times.
+
+    python -m benchmarks.fast_distinct
+"""
+from benchmarks import setup_django, timeit
+
+
+def run(number_of_objects=5000, number_of_related_objects=5, number=15):
+    from test_chamber.models import RelatedSmartModel, TestSmartModel
+
+    TestSmartModel.objects.bulk_create([
+        TestSmartModel(name=f'name{i % 100}') for i in range(number_of_objects)
+    ])
+    RelatedSmartModel.objects.bulk_create([
+        RelatedSmartModel(test_smart_model_id=pk)
+        for pk in TestSmartModel.objects.values_list('pk', flat=True)
+        for _ in range(number_of_related_objects)
+    ])
+
+    def get_queryset():
+        return TestSmartModel.objects.filter(test_smart_models__isnull=False).filter(test_smart_models__pk__gt=0)
+
+    querysets = {
+        'two joins': get_queryset,
+        'two joins, ordered by name': lambda: get_queryset().order_by('name'),
+        'two joins, filtered by name': lambda: get_queryset().filter(name='name1'),
+    }
+    for label, queryset_factory in querysets.items():
+        timeit(f'{label}: distinct()', lambda: list(queryset_factory().distinct()), number)
+        for strategy in ('pk_in', 'exists', 'window', 'auto'):
+            timeit(
+                f'{label}: fast_distinct({strategy})',
+                lambda: list(queryset_factory().fast_distinct(strategy=strategy)),
+                number
+            )
+
+
+if __name__ == '__main__':
+    setup_django()
+    run()
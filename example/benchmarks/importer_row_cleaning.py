@@ -0,0 +1,52 @@
+"""
+Per row time of the importer row cleaning. Rows of the example/data CSV files are scaled to 1M rows and cleaned
+with the previous get_fields_dict implementation (clean methods resolved for every cell), get_fields_dict with
+the compiled row cleaner and the compiled row cleaner called directly.
+
+    python -m benchmarks.importer_row_cleaning
+"""
+import csv
+import os
+import time
+
+from itertools import zip_longest
+
+from benchmarks import PROJECT_DIR, setup_django
+
+
+NUMBER_OF_ROWS = 1000000
+
+
+def legacy_get_fields_dict(importer, row):
+    return {k: getattr(importer, 'clean_{}'.format(k), lambda x: x)(v.strip() if isinstance(v, str) else None)
+            for k, v in zip_longest(importer.get_fields(), row)}
+
+
+def get_rows(number_of_rows=NUMBER_OF_ROWS):
+    rows = []
+    for file_name in ('all_fields_filled.csv', 'required_fields_filled.csv'):
+        with open(os.path.join(PROJECT_DIR, 'data', file_name)) as f:
+            rows += [row for row in list(csv.reader(f, delimiter=';'))[1:] if any(row)]
+    return (rows * (number_of_rows // len(rows) + 1))[:number_of_rows]
+
+
+def run(label, clean_row, rows):
+    start = time.perf_counter()
+    for row in rows:
+        clean_row(row)
+    duration = time.perf_counter() - start
+    print('{:40s} {:8.2f} s {:10.0f} ns/row'.format(label, duration, duration / len(rows) * 1e9))
+
+
+if __name__ == '__main__':
+    setup_django()
+
+    from test_chamber.importers import BulkCSVRecordImporter
+
+    rows = get_rows()
+    importer = BulkCSVRecordImporter()
+    run('previous get_fields_dict', lambda row: legacy_get_fields_dict(importer, row), rows)
+    with importer._compile_row_cleaner():  # pylint: disable=W0212
+        # Row cleaner is compiled once per import
+        run('get_fields_dict', importer.get_fields_dict, rows)
+    run('compiled row cleaner', importer.compile_row_cleaner(), rows)
@@ -0,0 +1,40 @@
+"""
+Wall time of the _smart_meta access and of the SmartModel save() overhead with options created on every access
+(previous OptionsLazy behaviour) and with options cached per model class. Model.save_base is patched to a no-op
+to isolate the SmartModel save pipeline from the database.
+
+    python -m benchmarks.smart_meta
+"""
+from unittest.mock import patch
+
+from benchmarks import setup_django, timeit
+
+
+def uncached_options_get(self, instance=None, owner=None):
+    return self.klass(owner)
+
+
+def run(label, number=20000):
+    from test_chamber.models import TestSmartModel
+
+    obj = TestSmartModel.objects.create(name='name')
+
+    def save():
+        obj.name = 'name{}'.format(obj.pk)
+        obj.save()
+
+    timeit(f'{label}: _smart_meta access', lambda: TestSmartModel._smart_meta, number)
+    timeit(f'{label}: save()', save, number)
+
+
+if __name__ == '__main__':
+    setup_django()
+
+    from django.db.models import Model
+
+    from chamber.patch import OptionsLazy
+
+    with patch.object(Model, 'save_base', lambda *args, **kwargs: None):
+        with patch.object(OptionsLazy, '__get__', uncached_options_get):
+            run('options created on every access')
+        run('options cached per model class')
@@ -1,14 +1,32 @@
-from io import StringIO
+from datetime import datetime
+from io import BytesIO, StringIO
+from unittest.mock import patch
+import gzip
 import os
+import tempfile
 
 from django.conf import settings
 from django.core.management import call_command
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, transaction
+from django.utils.timezone import make_aware
 
-from germanium.tools import assert_equal  # pylint: disable=E0401
+from chamber.importers import CSVImporter, CSVImportError, CSVRowError, fast_count, get_row_chunks, simple_count
+
+from germanium.tools import assert_equal, assert_is_none, assert_raises  # pylint: disable=E0401
 
 from test_chamber.importers import BulkCSVRecordImporter, CSVRecordImporter  # pylint: disable=E0401
-from test_chamber.models import CSVRecord  # pylint: disable=E0401
+from test_chamber.models import CSVRecord, DiffModel, ShortcutsModel  # pylint: disable=E0401
+
+
+class NonSeekableBytesIO(BytesIO):
+
+    def seekable(self):
+        return False
+
+    def seek(self, *args, **kwargs):
+        raise OSError('Stream is not seekable')
 
 
 class ImporterTestCase(TestCase):
@@ -41,6 +59,227 @@ class ImporterTestCase(TestCase):
             CSVRecordImporter().import_csv(f)
         assert_equal(CSVRecord.objects.count(), 5)
 
+    def test_records_should_be_bulk_imported_from_csv_in_streaming_mode(self):
+        progress = []
+
+        class StreamingBulkCSVRecordImporter(BulkCSVRecordImporter):
+            streaming = True
+            batch_size = 3
+
+            def _post_batch_create(self, created_count, row_count):
+                progress.append((row_count, self.progress_stream.progress))
+
+        StreamingBulkCSVRecordImporter().import_csv()
+
+        assert_equal(CSVRecord.objects.count(), 7)
+        assert_equal(CSVRecord.objects.last().name, 'Geordi LaForge')
+        assert_equal(CSVRecord.objects.last().number, 888)
+        assert_equal(progress[-1], (None, 1.0))
+        assert_equal([ratio for _, ratio in progress], sorted(ratio for _, ratio in progress))
+
+    def test_records_should_be_imported_from_non_seekable_streams(self):
+        with open(os.path.join(settings.PROJECT_DIR, 'data', 'required_fields_filled.csv'), 'rb') as f:
+            data = f.read()
+
+        importer = BulkCSVRecordImporter()
+        importer.import_csv(NonSeekableBytesIO(data))
+        assert_equal(CSVRecord.objects.count(), 5)
+        assert_is_none(importer.progress_stream)
+
+        CSVRecord.objects.all().delete()
+        CSVRecordImporter().import_csv(line for line in data.decode('utf-8').splitlines())
+        assert_equal(CSVRecord.objects.count(), 5)
+
+    def test_fast_count_should_count_lines_or_csv_rows(self):
+        data = 'id;name\n1;"Jean-Luc\nPicard"\n2;"William ""Number One""\n\nRiker"\n\n3;Worf'
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test.csv')
+            with open(path, 'w', newline='') as f:
+                f.write(data)
+            with open(path, 'rb') as f:
+                assert_equal(fast_count(f), 8)
+            with open(path) as f:
+                assert_equal(fast_count(f), simple_count(f))
+            with open(path) as f:
+                assert_equal(fast_count(f, exact=True, delimiter=';'), 5)
+            with open(path, 'w', newline='') as f:
+                f.write(data + '\n')
+            with open(path) as f:
+                assert_equal((fast_count(f), fast_count(f, exact=True)), (8, 5))
+
+            gzip_path = os.path.join(directory, 'test.csv.gz')
+            with gzip.open(gzip_path, 'wt') as f:
+                f.write(data)
+            with gzip.open(gzip_path, 'rt') as f:
+                assert_equal(fast_count(f), 8)
+            with gzip.open(gzip_path, 'rt') as f:
+                assert_equal(fast_count(f, exact=True, delimiter=';'), 5)
+
+        assert_equal(fast_count(StringIO(data)), 8)
+        assert_equal(fast_count(StringIO(data), exact=True, delimiter=';'), 5)
+
+    def test_records_should_be_upserted_in_batches(self):
+        import_counts = []
+
+        class BatchCSVRecordImporter(CSVRecordImporter):
+            batch_size = 3
+            query_fields = ('id',)
+            update_fields = ('name',)
+
+            def _post_import_rows(self, created_count, updated_count=0):
+                import_counts.append((created_count, updated_count))
+
+        CSVRecord.objects.create(id=2, name='Number One', number=1)
+
+        # 3 batches with transactions, SELECT of existing objects, INSERT, UPDATE of the existing object and
+        # unique validation of every created smart model
+        with self.assertNumQueries(3 * 5 + 2 + 3 + 1 + 6):
+            BatchCSVRecordImporter().import_csv()
+
+        assert_equal(import_counts, [(6, 1)])
+        assert_equal(CSVRecord.objects.count(), 7)
+        assert_equal(CSVRecord.objects.get(id=2).name, 'William T. Riker')
+        assert_equal(CSVRecord.objects.get(id=2).number, 1)  # Only update fields are updated
+        assert_equal(CSVRecord.objects.get(id=7).number, None)  # Same as update_or_create with query and update fields
+
+        BatchCSVRecordImporter().import_csv(
+            ['id;name;number', '7;Geordi;1', '8;Wesley Crusher;1', '8;Wesley;1', '', '1;Jean-Luc Picard;1']
+        )
+        assert_equal(import_counts[-1], (1, 3))
+        assert_equal(
+            list(CSVRecord.objects.filter(id__in=(1, 7, 8)).order_by('id').values_list('name', flat=True)),
+            ['Jean-Luc Picard', 'Geordi', 'Wesley']
+        )
+
+    def test_upsert_should_find_existing_objects_in_chunks_with_overlapping_query_and_update_fields(self):
+        class BatchCSVRecordImporter(CSVRecordImporter):
+            batch_size = 10
+            query_fields = ('id', 'name')
+            update_fields = ('name', 'number')
+
+            def clean_number(self, value):
+                return int(value)
+
+        CSVRecord.objects.create(id=1, name='Picard', number=1)
+        CSVRecord.objects.create(id=3, name='Worf', number=1)
+
+        with patch('chamber.importers.EXISTING_OBJECTS_QUERY_SIZE', 2):
+            with CaptureQueriesContext(connection) as captured_queries:
+                BatchCSVRecordImporter().import_csv(
+                    ['id;name;number', '1;Picard;10', '2;Riker;20', '3;Worf;30', '4;Troi;40', '5;Data;50']
+                )
+        assert_equal(
+            len([query for query in captured_queries if query['sql'].startswith('SELECT "test_chamber_csvrecord"')]), 3
+        )
+        assert_equal(
+            list(CSVRecord.objects.order_by('id').values_list('id', 'name', 'number')),
+            [(1, 'Picard', 10), (2, 'Riker', 20), (3, 'Worf', 30), (4, 'Troi', 40), (5, 'Data', 50)]
+        )
+
+    def test_upsert_should_match_existing_objects_by_normalized_values(self):
+        upsert_counts = []
+
+        class DiffModelImporter(CSVImporter):
+            model_class = DiffModel
+            fields = ('name', 'datetime', 'number')
+            query_fields = ('datetime',)
+            update_fields = ('name', 'number')
+            batch_size = 10
+
+            def _post_import_rows(self, created_count, updated_count=0):
+                upsert_counts.append((created_count, updated_count))
+
+        DiffModel.objects.create(name='Picard', datetime=make_aware(datetime(2020, 1, 1, 10)), number=1)
+
+        # Naive datetime of the CSV matches the aware datetime of the database
+        with self.assertWarns(RuntimeWarning):
+            DiffModelImporter().import_csv(['name;datetime;number', 'Riker;2020-01-01 10:00;2'])
+        assert_equal(upsert_counts, [(0, 1)])
+        assert_equal(list(DiffModel.objects.values_list('name', 'number')), [('Riker', 2)])
+
+    def test_upsert_should_update_auto_now_fields_of_not_smart_models(self):
+        class ShortcutsModelImporter(CSVImporter):
+            model_class = ShortcutsModel
+            fields = ('name', 'number')
+            query_fields = ('name',)
+            update_fields = ('number',)
+            batch_size = 10
+
+        ShortcutsModel.objects.create(name='Picard', datetime=make_aware(datetime(2020, 1, 1)), number=1)
+        with patch.object(ShortcutsModel._meta.get_field('datetime'), 'auto_now', True):
+            ShortcutsModelImporter().import_csv(['name;number', 'Picard;2', 'Riker;3'])
+        obj = ShortcutsModel.objects.get(name='Picard')
+        assert_equal(obj.number, 2)
+        assert_equal(obj.datetime.year, datetime.now().year)
+
+    def test_bulk_import_should_skip_invalid_rows_only_if_it_is_set(self):
+        class InvalidRowsBulkCSVRecordImporter(BulkCSVRecordImporter):
+
+            def clean_number(self, value):
+                return int(value)
+
+        with assert_raises(ValueError):
+            InvalidRowsBulkCSVRecordImporter().import_csv(['id;name;number', '1;Picard;40', '2;Riker;x'])
+        assert_equal(CSVRecord.objects.count(), 0)
+
+        InvalidRowsBulkCSVRecordImporter.skip_invalid_rows = True
+        with assert_raises(CSVImportError) as ex:
+            InvalidRowsBulkCSVRecordImporter().import_csv(
+                ['id;name;number', '1;Picard;40', '2;Riker;x', '', '3;Crusher;30', '4;Troi;y']
+            )
+        assert_equal(
+            ex.exception.errors,
+            [
+                CSVRowError(3, ['2', 'Riker', 'x'], "ValueError: invalid literal for int() with base 10: 'x'"),
+                CSVRowError(6, ['4', 'Troi', 'y'], "ValueError: invalid literal for int() with base 10: 'y'"),
+            ]
+        )
+        assert_equal(list(CSVRecord.objects.order_by('pk').values_list('pk', 'number')), [(1, 40), (3, 30)])
+
+    def test_compiled_row_cleaner_should_return_cleaned_fields_dict(self):
+        importer = BulkCSVRecordImporter()
+        row_cleaner = importer.compile_row_cleaner()
+
+        assert_equal(row_cleaner([' 1', ' Worf ', '20']), {'id': '1', 'name': 'Worf', 'number': 888})
+        assert_equal(row_cleaner(['1']), {'id': '1', 'name': None, 'number': 888})
+        assert_equal(
+            row_cleaner(['1', 'Worf', '20', 'extra']), {'id': '1', 'name': 'Worf', 'number': 888, None: 'extra'}
+        )
+        assert_equal(importer.get_fields_dict(['2', 'Data', '']), {'id': '2', 'name': 'Data', 'number': 888})
+
+        with patch.object(importer, 'compile_row_cleaner', wraps=importer.compile_row_cleaner) as compile_row_cleaner:
+            importer.import_csv(['id;name;number', '1;Picard;40', '2;Riker;30'])
+        assert_equal(compile_row_cleaner.call_count, 1)
+        assert_is_none(importer._row_cleaner)
+
+    def test_row_cleaner_should_be_compiled_again_with_every_import(self):
+        class DynamicFieldsBulkCSVRecordImporter(BulkCSVRecordImporter):
+            delete_existing_objects = True
+
+            def get_fields(self):
+                return self.import_fields
+
+        importer = DynamicFieldsBulkCSVRecordImporter()
+        importer.import_fields = ('id', 'name')
+        importer.import_rows([['1', 'Picard']])
+        assert_equal(list(CSVRecord.objects.values_list('pk', 'name')), [(1, 'Picard')])
+        assert_equal(importer.get_fields_dict(['2', 'Riker']), {'id': '2', 'name': 'Riker'})
+
+        importer.import_fields = ('name', 'id')
+        importer.import_rows([['Riker', '2']])
+        assert_equal(list(CSVRecord.objects.values_list('pk', 'name')), [(2, 'Riker')])
+        assert_equal(importer.get_fields_dict(['Data', '3']), {'id': '3', 'name': 'Data'})
+
+    def test_get_row_chunks_should_split_data_on_row_boundaries(self):
+        data = b'id;name\n1;"Jean-Luc\nPicard"\n2;"William ""Number One""\n\nRiker"\n3;Worf\n'
+
+        assert_equal(get_row_chunks(data, 1000), [(0, len(data))])
+        chunks = get_row_chunks(data, 10, skip_header=True)
+        assert_equal(
+            [data[start:end] for start, end in chunks],
+            [b'1;"Jean-Luc\nPicard"\n', b'2;"William ""Number One""\n\nRiker"\n', b'3;Worf\n']
+        )
+
     def test_records_should_be_bulk_imported_from_csv_with_command(self):
         assert_equal(CSVRecord.objects.count(), 0)
         call_command('bulk_csv_import', stdout=StringIO(), stderr=StringIO())
@@ -54,3 +293,88 @@ class ImporterTestCase(TestCase):
         assert_equal(CSVRecord.objects.count(), 7)
         assert_equal(CSVRecord.objects.last().name, 'Geordi LaForge')  # Ensure correct value is stored
         assert_equal(CSVRecord.objects.last().number, 888)  # Ensure clean methods work
+
+
+class ParallelImporterTestCase(TransactionTestCase):
+
+    def test_records_should_be_bulk_imported_from_csv_in_parallel(self):
+        batches = []
+
+        class ParallelBulkCSVRecordImporter(BulkCSVRecordImporter):
+            parallel_workers = 2
+            parallel_chunk_size = 30
+            batch_size = 3
+
+            def _post_batch_create(self, created_count, row_count):
+                batches.append((created_count, row_count))
+
+        ParallelBulkCSVRecordImporter().import_csv()
+
+        assert_equal(batches, [(3, 9), (3, 9), (1, 9)])
+        assert_equal(
+            list(CSVRecord.objects.order_by('pk').values_list('pk', 'name', 'number')),
+            [
+                (1, 'Jean-Luc Picard', 888), (2, 'William T. Riker', 888), (3, 'Beverly Crusher', 888),
+                (4, 'Deanna Troi', 888), (5, 'Worf', 888), (6, 'Data', 888), (7, 'Geordi LaForge', 888),
+            ]
+        )
+
+        # Serial import reports the same row count
+        batches = []
+        CSVRecord.objects.all().delete()
+        ParallelBulkCSVRecordImporter.parallel_workers = None
+        ParallelBulkCSVRecordImporter().import_csv()
+        assert_equal({row_count for _, row_count in batches}, {9})
+
+    def test_parallel_bulk_import_should_report_row_errors_ordered_by_row_number(self):
+        class ParallelBulkCSVRecordImporter(BulkCSVRecordImporter):
+            parallel_workers = 2
+            parallel_chunk_size = 10
+            skip_invalid_rows = True
+
+            def clean_number(self, value):
+                return int(value)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write('id;name;number\n1;Picard;40\n2;Riker;x\n\n3;Crusher;30\n4;Troi;y\n5;Worf;20\n')
+            f.flush()
+            with assert_raises(CSVImportError) as ex:
+                with open(f.name) as csv_file:
+                    ParallelBulkCSVRecordImporter().import_csv(csv_file)
+
+        assert_equal(
+            ex.exception.errors,
+            [
+                CSVRowError(3, ['2', 'Riker', 'x'], "ValueError: invalid literal for int() with base 10: 'x'"),
+                CSVRowError(6, ['4', 'Troi', 'y'], "ValueError: invalid literal for int() with base 10: 'y'"),
+            ]
+        )
+        assert_equal(list(CSVRecord.objects.order_by('pk').values_list('pk', 'number')), [(1, 40), (3, 30), (5, 20)])
+
+    def test_parallel_bulk_import_should_stop_on_the_first_invalid_row(self):
+        class ParallelBulkCSVRecordImporter(BulkCSVRecordImporter):
+            parallel_workers = 2
+            parallel_chunk_size = 10
+            batch_size = 1
+
+            def clean_number(self, value):
+                return int(value)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write('id;name;number\n1;Picard;40\n2;Riker;x\n3;Crusher;30\n')
+            f.flush()
+            with assert_raises(ValueError):
+                with open(f.name) as csv_file:
+                    ParallelBulkCSVRecordImporter().import_csv(csv_file)
+
+        assert_equal(list(CSVRecord.objects.values_list('pk', flat=True)), [1])
+
+    def test_parallel_mode_should_not_be_used_inside_atomic_block(self):
+        class ParallelBulkCSVRecordImporter(BulkCSVRecordImporter):
+            parallel_workers = 2
+
+        with open(ParallelBulkCSVRecordImporter.csv_path) as csv_file:
+            assert_equal(ParallelBulkCSVRecordImporter()._get_parallel_path(csv_file), csv_file.name)
+            with transaction.atomic():
+                with self.assertLogs('chamber.importers', level='WARNING'):
+                    assert_is_none(ParallelBulkCSVRecordImporter()._get_parallel_path(csv_file))
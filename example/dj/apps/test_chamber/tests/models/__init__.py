@@ -1,21 +1,31 @@
+import gc
+import weakref
+
 from datetime import timedelta
+from unittest.mock import patch
 
-from django.db import OperationalError
+from django.apps.registry import Apps
+from django.db import NotSupportedError, OperationalError
 from django.core.exceptions import ValidationError
-from django.test import TransactionTestCase
+from django.test import TransactionTestCase, override_settings
 from django.utils import timezone
 
 from chamber.exceptions import PersistenceException
-from chamber.models.changed_fields import DynamicChangedFields, Unknown, Deferred
+from chamber.models import SmartModel
+from chamber.shortcuts import bulk_change
+from chamber.models.changed_fields import DynamicChangedFields, SnapshotStrategy, Unknown, Deferred
 from chamber.models.comparator import Comparator
 
-from germanium.tools import assert_equal, assert_false, assert_raises, assert_true  # pylint: disable=E0401
+from germanium.tools import (  # pylint: disable=E0401
+    assert_equal, assert_false, assert_is_none, assert_raises, assert_true
+)
 
 from test_chamber.models import ComparableModel, DiffModel, RelatedSmartModel, TestSmartModel  # pylint: disable=E0401
 
 from .dispatchers import *  # NOQA
 from .fields import *  # NOQA
 from .humanized_helpers import *  # NOQA
+from .instrumentation import *  # NOQA
 from .batch_iterator import *
 
 
@@ -186,6 +196,144 @@ class ModelsTestCase(TransactionTestCase):
         assert_false(obj.has_changed)
         assert_false(obj.changed_fields)
 
+    def test_smart_model_changed_fields_should_track_written_fields(self):
+        test_smart_model = TestSmartModel.objects.create(name='test')
+        obj = RelatedSmartModel.objects.get(pk=RelatedSmartModel.objects.create(test_smart_model=test_smart_model).pk)
+        assert_false(obj.has_changed)
+
+        obj.test_smart_model = TestSmartModel.objects.create(name='test2')
+        assert_equal(set(obj.changed_fields.keys()), {'test_smart_model'})
+        obj.test_smart_model_id = test_smart_model.pk
+        assert_false(obj.has_changed)
+
+        obj.save()
+        assert_false(obj.has_changed)
+        obj.test_smart_model_id = test_smart_model.pk
+        assert_false(obj.has_changed)
+
+    def test_smart_model_changed_fields_should_not_load_deferred_fields(self):
+        test_smart_model = TestSmartModel.objects.create(name='test')
+        obj = RelatedSmartModel.objects.only('pk').get(
+            pk=RelatedSmartModel.objects.create(test_smart_model=test_smart_model).pk
+        )
+        with self.assertNumQueries(0):
+            assert_false(obj.has_changed)
+            assert_equal(obj.changed_fields.current_values['test_smart_model'], Deferred)
+
+    def test_smart_model_changed_fields_should_compare_mutable_values_without_write(self):
+        obj = DiffModel.objects.create(name='test', datetime=timezone.now(), number=2, data={'test': ['data']})
+        static_changed_fields = obj.changed_fields.get_static_changes()
+        obj.data['test'].append('data2')
+        assert_equal(set(obj.changed_fields.keys()), {'data'})
+        assert_equal(obj.changed_fields['data'].initial, {'test': ['data']})
+        assert_equal(obj.changed_fields['data'].current, {'test': ['data', 'data2']})
+        assert_false(static_changed_fields)
+
+        obj.save()
+        assert_false(obj.has_changed)
+        obj.data['test'].pop()
+        assert_equal(set(obj.changed_fields.keys()), {'data'})
+
+    def test_smart_model_changed_fields_with_serialized_snapshot_strategy(self):
+        class SerializedSnapshotDiffModel(DiffModel):
+            class Meta:
+                proxy = True
+
+            class SmartMeta:
+                changed_fields_snapshot_strategy = SnapshotStrategy.SERIALIZED
+
+        obj = SerializedSnapshotDiffModel.objects.create(
+            name='test', datetime=timezone.now(), number=2, data={'a': 1, 'b': [1, 2]}
+        )
+        obj = SerializedSnapshotDiffModel.objects.get(pk=obj.pk)
+        assert_false(obj.has_changed)
+        assert_equal(obj.initial_values['data'], {'a': 1, 'b': [1, 2]})
+
+        obj.data['b'].append(3)
+        assert_equal(set(obj.changed_fields.keys()), {'data'})
+        assert_equal(obj.changed_fields['data'].initial, {'a': 1, 'b': [1, 2]})
+        assert_equal(obj.changed_fields['data'].current, {'a': 1, 'b': [1, 2, 3]})
+
+        obj.data = {'b': [1, 2], 'a': 1}
+        assert_false(obj.has_changed)
+
+        obj.data['a'] = 2
+        obj.save()
+        assert_false(obj.has_changed)
+        assert_equal(obj.initial_values['data'], {'a': 2, 'b': [1, 2]})
+
+        # Unchanged serialized values are compared in the serialized form and are not deserialized
+        obj.name = 'test2'
+        with patch('chamber.models.changed_fields.pickle.loads') as pickle_loads:
+            static_changes = obj.changed_fields.get_static_changes()
+            assert_equal(set(static_changes.keys()), {'name'})
+            assert_equal(static_changes.initial_values['data'], {'a': 2, 'b': [1, 2]})
+        assert_false(pickle_loads.called)
+
+    def test_smart_model_static_changes_should_be_computed_only_if_instance_was_changed(self):
+        obj = DiffModel.objects.create(name='test', datetime=timezone.now(), number=2, data={'test': 'data'})
+        obj.name = 'test2'
+        static_changed_fields = obj.changed_fields.get_static_changes()
+        assert_true(static_changed_fields is obj.changed_fields.get_static_changes())
+
+        obj.number = 3
+        changed_static_changed_fields = obj.changed_fields.get_static_changes()
+        assert_false(static_changed_fields is changed_static_changed_fields)
+        assert_equal(set(changed_static_changed_fields.keys()), {'name', 'number'})
+
+        obj.data['test'] = 'data2'
+        assert_equal(set(obj.changed_fields.get_static_changes().keys()), {'name', 'number', 'data'})
+        assert_equal(set(changed_static_changed_fields.keys()), {'name', 'number'})
+
+        obj.save()
+        assert_false(obj.changed_fields.get_static_changes())
+
+    def test_smart_model_pre_save_changes_should_be_in_post_save_changed_fields(self):
+        obj = TestPreProxySmartModel.objects.create()
+        obj.name = 'test'
+
+        post_save_changed_fields = []
+
+        def _post_save(self, changed, changed_fields, *args, **kwargs):
+            post_save_changed_fields.append(changed_fields)
+
+        with patch.object(TestPreProxySmartModel, '_post_save', _post_save):
+            obj.save()
+        assert_equal(len(post_save_changed_fields), 1)
+        assert_false(post_save_changed_fields[0])
+
+    def test_smart_meta_should_be_created_once_per_model(self):
+        class SmartMetaTestProxySmartModel(TestProxySmartModel):
+            class Meta:
+                proxy = True
+
+            class SmartMeta:
+                is_save_atomic = True
+
+        assert_true(TestSmartModel._smart_meta is TestSmartModel._smart_meta)
+        assert_true(SmartMetaTestProxySmartModel._smart_meta is SmartMetaTestProxySmartModel()._smart_meta)
+        assert_false(TestSmartModel._smart_meta is SmartMetaTestProxySmartModel._smart_meta)
+        assert_false(TestSmartModel._smart_meta.is_save_atomic)
+        assert_true(SmartMetaTestProxySmartModel._smart_meta.is_save_atomic)
+
+        smart_meta = TestSmartModel._smart_meta
+        with override_settings(CHAMBER_TEST_SETTING=True):
+            assert_false(smart_meta is TestSmartModel._smart_meta)
+
+    def test_smart_meta_should_not_prevent_dynamic_model_from_being_garbage_collected(self):
+        isolated_apps = Apps()
+
+        class DynamicSmartModel(SmartModel):
+            class Meta:
+                app_label = 'test_chamber'
+                apps = isolated_apps
+
+        assert_false(DynamicSmartModel._smart_meta.is_save_atomic)
+        model_ref = weakref.ref(DynamicSmartModel)
+        del DynamicSmartModel, isolated_apps
+        gc.collect()
+        assert_is_none(model_ref())
+
     def test_comparator(self):
         obj1 = ComparableModel.objects.create(name='test')
         obj2 = ComparableModel.objects.create(name='test')
@@ -279,6 +427,44 @@ class ModelsTestCase(TransactionTestCase):
         obj.delete(is_cleaned_pre_delete=False)
         assert_false(PreDeleteTestProxySmartModel.objects.filter(pk=obj_pk).exists())
 
+    def test_smart_queryset_smart_delete_should_call_delete_hooks_and_delete_in_chunks(self):
+        class AtomicDeleteTestProxySmartModel(TestProxySmartModel):
+            class Meta:
+                proxy = True
+                verbose_name = 'testmodel'
+                verbose_name_plural = 'testmodels'
+
+            class SmartMeta:
+                is_cleaned_pre_save = False
+                is_delete_atomic = True
+
+        objs = [AtomicDeleteTestProxySmartModel.objects.create(name=str(i)) for i in range(5)]
+        kept_obj = AtomicDeleteTestProxySmartModel.objects.create(name='kept')
+        RelatedSmartModel.objects.create(test_smart_model_id=objs[0].pk)
+        deleted_pks = []
+
+        def _post_delete(self, *args, **kwargs):
+            deleted_pks.append((self.pk, self.name))
+
+        with patch.object(AtomicDeleteTestProxySmartModel, '_post_delete', _post_delete):
+            # 3 chunks (SELECT, BEGIN, cascade DELETE of related objects, DELETE, COMMIT) and the last empty SELECT
+            with self.assertNumQueries(3 * 5 + 1):
+                assert_equal(
+                    AtomicDeleteTestProxySmartModel.objects.exclude(pk=kept_obj.pk).smart_delete(chunk_size=2),
+                    (6, {'test_chamber.RelatedSmartModel': 1, 'test_chamber.AtomicDeleteTestProxySmartModel': 5})
+                )
+        assert_equal(deleted_pks, [(None, obj.name) for obj in objs])
+        assert_equal(list(AtomicDeleteTestProxySmartModel.objects.all()), [kept_obj])
+
+        with patch.object(AtomicDeleteTestProxySmartModel, '_clean_pre_delete', side_effect=PersistenceException):
+            assert_raises(
+                PersistenceException, AtomicDeleteTestProxySmartModel.objects.all().smart_delete,
+                is_cleaned_pre_delete=True
+            )
+            assert_true(AtomicDeleteTestProxySmartModel.objects.exists())
+            AtomicDeleteTestProxySmartModel.objects.all().smart_delete()
+        assert_false(AtomicDeleteTestProxySmartModel.objects.exists())
+
     def test_smart_model_clean_post_delete(self):
         class PostDeleteTestProxySmartModel(TestProxySmartModel):
             class Meta:
@@ -378,6 +564,91 @@ class ModelsTestCase(TransactionTestCase):
             ['c', 'b', 'a']
         )
 
+    def test_smart_queryset_fast_distinct_strategies(self):
+        t1 = TestSmartModel.objects.create(name='b')
+        t2 = TestSmartModel.objects.create(name='a')
+        TestSmartModel.objects.create(name='c')
+        for t in (t1, t1, t2, t2, t2):
+            RelatedSmartModel.objects.create(test_smart_model=t)
+        qs = TestSmartModel.objects.filter(test_smart_models__isnull=False).filter(test_smart_models__pk__gt=0)
+        assert_equal(qs.count(), 13)
+
+        for strategy in (None, 'auto', 'pk_in', 'exists', 'window'):
+            assert_equal(qs.fast_distinct(strategy=strategy).count(), 2)
+            assert_equal(
+                list(qs.order_by('name').fast_distinct(strategy=strategy).values_list('name', flat=True)), ['a', 'b']
+            )
+        assert_raises(NotSupportedError, qs.fast_distinct, strategy='distinct_on')
+        assert_raises(ValueError, qs.fast_distinct, strategy='invalid')
+
+    def test_smart_queryset_fast_distinct_auto_strategy_should_not_rewrite_query_without_multivalued_joins(self):
+        t = TestSmartModel.objects.create(name='name')
+        RelatedSmartModel.objects.create(test_smart_model=t)
+        qs = RelatedSmartModel.objects.filter(test_smart_model__name='name')
+
+        assert_equal(qs._get_fast_distinct_strategy(), None)
+        assert_equal(str(qs.fast_distinct(strategy='auto').query), str(qs.query))
+        assert_equal(str(qs.fast_distinct().query), str(qs.fast_distinct(strategy='pk_in').query))
+        assert_equal(
+            TestSmartModel.objects.filter(test_smart_models__isnull=False)._get_fast_distinct_strategy(), 'exists'
+        )
+        assert_equal(TestSmartModel.objects.order_by('test_smart_models__pk')._get_fast_distinct_strategy(), 'exists')
+
+    def test_smart_bulk_update_should_call_save_hooks_with_changed_fields(self):
+        obj1 = DiffModel.objects.create(name='test', datetime=timezone.now(), number=1)
+        obj2 = DiffModel.objects.create(name='test2', datetime=timezone.now(), number=2)
+
+        post_save_changed_fields = {}
+
+        def _post_save(self, changed, changed_fields, *args, **kwargs):
+            post_save_changed_fields[self.pk] = (changed, set(changed_fields.keys()))
+
+        bulk_change([obj1, obj2], name='test2')
+        with patch.object(DiffModel, '_post_save', _post_save):
+            DiffModel.objects.smart_bulk_update([obj1, obj2], update_only_changed_fields=True)
+
+        assert_equal(post_save_changed_fields, {obj1.pk: (True, {'name'}), obj2.pk: (True, set())})
+        assert_false(obj1.has_changed)
+        assert_false(obj2.has_changed)
+        assert_equal(set(DiffModel.objects.values_list('name', flat=True)), {'test2'})
+        assert_raises(ValueError, DiffModel.objects.smart_bulk_update, [DiffModel(name='test')])
+
+    def test_smart_bulk_create_should_call_save_hooks_and_insert_objects_in_batches(self):
+        objs = [DiffModel(name=f'test{i}', datetime=timezone.now(), number=i) for i in range(3)]
+        post_save_changed_fields = {}
+
+        def _post_save(self, changed, changed_fields, *args, **kwargs):
+            post_save_changed_fields[self.number] = (changed, 'name' in changed_fields)
+
+        with patch.object(DiffModel, '_post_save', _post_save):
+            with self.assertNumQueries(3):  # SAVEPOINT, INSERT, RELEASE
+                assert_equal(DiffModel.objects.smart_bulk_create(objs), objs)
+
+        assert_equal(post_save_changed_fields, {0: (False, True), 1: (False, True), 2: (False, True)})
+        assert_equal(list(DiffModel.objects.order_by('number')), objs)
+        assert_false(any(obj.is_adding or obj.has_changed for obj in objs))
+        assert_raises(ValueError, DiffModel.objects.smart_bulk_create, objs)
+        with assert_raises(PersistenceException):
+            DiffModel.objects.smart_bulk_create([DiffModel(name='x' * 101, datetime=timezone.now(), number=4)])
+        assert_equal(DiffModel.objects.count(), 3)
+
+    def test_smart_bulk_update_should_group_objects_by_changed_fields(self):
+        objs = [DiffModel.objects.create(name='test', datetime=timezone.now(), number=i) for i in range(5)]
+        for obj in objs[:3]:
+            obj.change(name=f'name{obj.number}')
+        objs[3].change(name='name3', number=30)
+        # Value changed in the database must not be overwritten by objects which do not change the field
+        DiffModel.objects.filter(pk=objs[0].pk).update(number=10)
+
+        # SAVEPOINT, UPDATE of the name, UPDATE of the name and number, RELEASE
+        with self.assertNumQueries(4):
+            DiffModel.objects.smart_bulk_update(objs, update_only_changed_fields=True)
+
+        assert_equal(
+            list(DiffModel.objects.order_by('pk').values_list('name', 'number')),
+            [('name0', 10), ('name1', 1), ('name2', 2), ('name3', 30), ('test', 4)]
+        )
+
     def test_smart_model_first_and_last_with_order(self):
         test3 = TestSmartModel.objects.create(name='3')
         test2 = TestSmartModel.objects.create(name='2')
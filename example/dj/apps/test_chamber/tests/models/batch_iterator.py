@@ -1,12 +1,17 @@
 from datetime import timedelta
+from unittest.mock import MagicMock, patch
 
 from django.core.cache import cache
+from django.db import transaction
+from django.db.models.query import QuerySet
 from django.test import TransactionTestCase
 from django.utils.timezone import now
 
-from chamber.models.batch_iterator import BatchCachedQuerysetIterator
+from chamber.models.batch_iterator import (
+    BatchCachedQuerysetIterator, ShardedBatchCachedQuerysetIterator, estimate_count
+)
 
-from germanium.tools import assert_equal, assert_raises, assert_is_none
+from germanium.tools import assert_equal, assert_false, assert_raises, assert_is_none, assert_true
 
 from freezegun import freeze_time
 
@@ -15,6 +20,7 @@ from test_chamber.models import TestSmartModel
 
 __all__ = (
     'BatchCachedQuerysetIteratorTestCase',
+    'ShardedBatchCachedQuerysetIteratorTestCase',
 )
 
 
@@ -112,3 +118,161 @@ class BatchCachedQuerysetIteratorTestCase(TransactionTestCase):
                 TestSmartModel.objects.all(), 'expiration', batch_size=5, expiration=5
             )
             assert_equal(iterated_objs, list(iterator))
+
+    def test_batch_cached_iterator_should_iterate_all_batches(self):
+        test_objs = [TestSmartModel.objects.create(name=str(i)) for i in range(25)]
+        iterator = BatchCachedQuerysetIterator(TestSmartModel.objects.all(), 'all', batch_size=10, expiration=10)
+
+        with self.assertNumQueries(3):
+            assert_equal(list(iterator.iterate_all_batches()), test_objs)
+        assert_equal(iterator.remaining_number_of_objects, 0)
+        assert_equal(cache.get('batch_queryset_iterator_all'), test_objs[-1].pk)
+
+    def test_batch_cached_iterator_should_resume_all_batches_iteration_from_last_complete_batch(self):
+        test_objs = [TestSmartModel.objects.create(name=str(i)) for i in range(25)]
+        iterator = BatchCachedQuerysetIterator(
+            TestSmartModel.objects.all(), 'resume', batch_size=10, expiration=10
+        )
+        with assert_raises(RuntimeError):
+            for i, obj in enumerate(iterator.iterate_all_batches(prefetch=True)):
+                if i == 15:
+                    raise RuntimeError
+        assert_equal(cache.get('batch_queryset_iterator_resume'), test_objs[9].pk)
+
+        iterator = BatchCachedQuerysetIterator(
+            TestSmartModel.objects.all(), 'resume', batch_size=10, expiration=10
+        )
+        assert_equal(list(iterator.iterate_all_batches(prefetch=True)), test_objs[10:])
+
+    def test_batch_cached_iterator_should_not_prefetch_batches_inside_atomic_block(self):
+        with transaction.atomic():
+            test_objs = [TestSmartModel.objects.create(name=str(i)) for i in range(25)]
+            iterator = BatchCachedQuerysetIterator(
+                TestSmartModel.objects.all(), 'atomic', batch_size=10, expiration=10
+            )
+            with patch('chamber.models.batch_iterator.ThreadPoolExecutor') as thread_pool_executor:
+                assert_equal(list(iterator.iterate_all_batches(prefetch=True)), test_objs)
+            thread_pool_executor.assert_not_called()
+
+    def test_batch_cached_iterator_should_use_composite_keyset_cursor(self):
+        test_objs = [TestSmartModel.objects.create(name=str(i % 3)) for i in range(10)]
+        sorted_test_objs = sorted(test_objs, key=lambda obj: (-int(obj.name), obj.pk))
+        iterator = BatchCachedQuerysetIterator(
+            TestSmartModel.objects.all(), 'composite', batch_size=4, expiration=10, ordering=('-name',)
+        )
+        assert_equal(list(iterator), sorted_test_objs[:4])
+        assert_equal(cache.get('batch_queryset_iterator_composite'), ('1', sorted_test_objs[3].pk))
+        assert_equal(iterator.remaining_number_of_objects, 6)
+
+        iterator = BatchCachedQuerysetIterator(
+            TestSmartModel.objects.all(), 'composite', batch_size=4, expiration=10, ordering=('-name',)
+        )
+        assert_equal(list(iterator.iterate_all_batches()), sorted_test_objs[4:])
+
+    def test_batch_cached_iterator_should_count_objects_only_once(self):
+        [TestSmartModel.objects.create(name=str(i)) for i in range(20)]
+        iterator = BatchCachedQuerysetIterator(TestSmartModel.objects.all(), 'counts', batch_size=10, expiration=10)
+        with self.assertNumQueries(1):
+            assert_equal(iterator.total_number_of_objects, 20)
+            assert_equal(iterator.remaining_number_of_objects, 20)
+            assert_equal(len(iterator), 10)
+
+        list(iterator)
+        with self.assertNumQueries(0):
+            assert_equal(iterator.total_number_of_objects, 20)
+            assert_equal(iterator.remaining_number_of_objects, 10)
+
+        iterator = BatchCachedQuerysetIterator(TestSmartModel.objects.all(), 'counts', batch_size=10, expiration=10)
+        with self.assertNumQueries(0):
+            assert_equal(iterator.total_number_of_objects, 20)
+            assert_equal(iterator.remaining_number_of_objects, 10)
+
+    def test_batch_cached_iterator_should_estimate_count(self):
+        [TestSmartModel.objects.create(name=str(i)) for i in range(20)]
+        # SQLite has no planner statistics, the exact count is used
+        assert_equal(estimate_count(TestSmartModel.objects.all()), 20)
+        assert_equal(estimate_count(TestSmartModel.objects.filter(name='1')), 1)
+
+        iterator = BatchCachedQuerysetIterator(
+            TestSmartModel.objects.all(), 'estimated_counts', batch_size=10, expiration=10, estimate_count=True
+        )
+        assert_equal(iterator.remaining_number_of_objects, 20)
+
+    def test_estimate_count_should_use_postgresql_planner_statistics(self):
+        [TestSmartModel.objects.create(name=str(i)) for i in range(20)]
+        connection = MagicMock(vendor='postgresql')
+        cursor = connection.cursor.return_value.__enter__.return_value
+        with patch('chamber.models.batch_iterator.connections', {'default': connection}):
+            cursor.fetchone.return_value = (1000.0,)
+            assert_equal(estimate_count(TestSmartModel.objects.all()), 1000)
+
+            # Not analyzed table statistics are ignored and exact count is used
+            for reltuples in (-1.0, 0.0):
+                cursor.fetchone.return_value = (reltuples,)
+                assert_equal(estimate_count(TestSmartModel.objects.all()), 20)
+
+            # JSON plan (Django >= 4.2) and its python representation (Django < 4.2)
+            for explain_output in ('[{"Plan": {"Plan Rows": 5, "Parallel Aware": false}}]',
+                                   "[{'Plan': {'Plan Rows': 5, 'Parallel Aware': False}}]"):
+                with patch.object(QuerySet, 'explain', return_value=explain_output):
+                    assert_equal(estimate_count(TestSmartModel.objects.filter(name='1')), 5)
+
+
+class ShardedBatchCachedQuerysetIteratorTestCase(TransactionTestCase):
+
+    def test_sharded_iterator_should_split_queryset_to_shards(self):
+        test_objs = [TestSmartModel.objects.create(name=str(i)) for i in range(12)]
+        pks = [obj.pk for obj in test_objs]
+        iterator = ShardedBatchCachedQuerysetIterator(
+            TestSmartModel.objects.all(), 'shards', number_of_shards=3, batch_size=2, expiration=10
+        )
+        assert_equal(iterator.shard_boundaries, [pks[4], pks[8]])
+        assert_equal(cache.get('batch_queryset_iterator_shards_shards'), [pks[4], pks[8]])
+        assert_equal(list(iterator.get_shard_queryset(1)), test_objs[4:8])
+
+        iterator = ShardedBatchCachedQuerysetIterator(
+            TestSmartModel.objects.all(), 'percentiles', number_of_shards=4, expiration=10,
+            split_by_percentiles=True
+        )
+        assert_equal(iterator.shard_boundaries, [pks[3], pks[6], pks[9]])
+
+    def test_sharded_iterator_workers_should_claim_different_shards(self):
+        test_objs = [TestSmartModel.objects.create(name=str(i)) for i in range(12)]
+        worker1_iterator = ShardedBatchCachedQuerysetIterator(
+            TestSmartModel.objects.all(), 'workers', number_of_shards=3, batch_size=2, expiration=10
+        ).iterate_claimed_shards()
+        worker2_iterator = ShardedBatchCachedQuerysetIterator(
+            TestSmartModel.objects.all(), 'workers', number_of_shards=3, batch_size=2, expiration=10
+        ).iterate_claimed_shards()
+
+        assert_equal(next(worker1_iterator), test_objs[0])
+        assert_equal(next(worker2_iterator), test_objs[4])
+        iterated_objs = [test_objs[0], test_objs[4]] + list(worker1_iterator) + list(worker2_iterator)
+        assert_equal(sorted(iterated_objs, key=lambda obj: obj.pk), test_objs)
+
+        iterator = ShardedBatchCachedQuerysetIterator(
+            TestSmartModel.objects.all(), 'workers', number_of_shards=3, batch_size=2, expiration=10
+        )
+        assert_true(all(iterator.is_shard_finished(shard) for shard in range(3)))
+        assert_is_none(iterator.claim_shard())
+
+    def test_sharded_iterator_should_renew_lease_and_stop_iteration_when_lease_is_lost(self):
+        test_objs = [TestSmartModel.objects.create(name=str(i)) for i in range(6)]
+        lease_cache_key = 'batch_queryset_iterator_lease_shard_0_lease'
+        with freeze_time(now()) as frozen_time:
+            iterator = ShardedBatchCachedQuerysetIterator(
+                TestSmartModel.objects.all(), 'lease', number_of_shards=1, batch_size=2, expiration=100,
+                lease_timeout=10
+            )
+            objs_iterator = iterator.iterate_claimed_shards()
+            assert_equal(next(objs_iterator), test_objs[0])
+            frozen_time.tick(timedelta(seconds=6))
+            assert_equal(next(objs_iterator), test_objs[1])
+            frozen_time.tick(timedelta(seconds=6))
+            # Lease was renewed, without renewal it would expire after 10 seconds
+            assert_equal(cache.get(lease_cache_key), iterator._lease_id)
+
+            cache.set(lease_cache_key, 'another_worker', 10)
+            assert_equal(list(objs_iterator), [])
+            assert_false(iterator.is_shard_finished(0))
+            assert_equal(cache.get(lease_cache_key), 'another_worker')
@@ -1,10 +1,13 @@
+from unittest.mock import patch
+
 from nose.tools import raises  # pylint: disable=E0401
 
 from django.core.exceptions import ImproperlyConfigured
+from django.dispatch import Signal
 from django.test import TransactionTestCase
 from django.db import transaction
 
-from chamber.models.dispatchers import BaseDispatcher, StateDispatcher
+from chamber.models.dispatchers import BaseDispatcher, CreatedDispatcher, PropertyDispatcher, StateDispatcher
 from chamber.shortcuts import change_and_save
 
 from germanium.tools import assert_equal  # pylint: disable=E0401
@@ -70,3 +73,68 @@ class DispatchersTestCase(TransactionTestCase):
             assert_equal(TestOnDispatchModel.objects.count(), 0)
         assert_equal(TestOnDispatchModel.objects.count(), 1)
 
+    def test_dispatchers_should_be_called_for_every_object_in_bulk_mode(self):
+        models = [TestDispatchersModel.objects.create() for _ in range(3)]
+        assert_equal(TestSmartModel.objects.count(), 0)
+        assert_equal(TestOnDispatchModel.objects.count(), 3)
+
+        TestDispatchersModel.objects.filter(pk__in=[m.pk for m in models[:2]]).change_and_save(
+            state=TestDispatchersModel.STATE.SECOND, bulk=True
+        )
+        assert_equal(TestSmartModel.objects.count(), 2)
+        assert_equal(TestOnDispatchModel.objects.count(), 5)
+
+        TestDispatchersModel.objects.all().change_and_save(state=TestDispatchersModel.STATE.SECOND, bulk=True)
+        assert_equal(TestSmartModel.objects.count(), 3)
+        assert_equal(TestOnDispatchModel.objects.count(), 6)
+
+    def test_dispatchers_should_be_called_in_connection_order_and_evaluated_only_for_matching_keys(self):
+        called_receivers = []
+
+        def get_handler(name):
+            def handler(instance, **kwargs):
+                called_receivers.append(name)
+            return handler
+
+        def receiver(**kwargs):
+            called_receivers.append('receiver')
+
+        signal = Signal()
+        state_field = TestDispatchersModel._meta.get_field('state')
+        created_dispatcher = CreatedDispatcher(get_handler('created'), signal=signal)
+        state_dispatcher = StateDispatcher(
+            get_handler('state'), TestDispatchersModel.STATE, state_field, TestDispatchersModel.STATE.SECOND,
+            signal=signal
+        )
+        property_dispatcher = PropertyDispatcher(get_handler('property'), 'always_dispatch', signal=signal)
+        state_dispatcher.connect(TestDispatchersModel)
+        created_dispatcher.connect(TestDispatchersModel)
+        signal.connect(receiver, sender=TestDispatchersModel)
+        property_dispatcher.connect(TestDispatchersModel)
+
+        instance = TestDispatchersModel(state=TestDispatchersModel.STATE.SECOND)
+        signal.send(sender=TestDispatchersModel, instance=instance, changed=False, changed_fields={})
+        assert_equal(called_receivers, ['created', 'receiver', 'property'])
+
+        called_receivers.clear()
+        signal.send(sender=TestDispatchersModel, instance=instance, changed=True, changed_fields={'state': 1})
+        assert_equal(called_receivers, ['state', 'receiver', 'property'])
+
+        called_receivers.clear()
+        with patch.object(CreatedDispatcher, '_can_dispatch') as created_can_dispatch:
+            with patch.object(StateDispatcher, '_can_dispatch') as state_can_dispatch:
+                signal.send(sender=TestDispatchersModel, instance=instance, changed=True, changed_fields={'name': 1})
+        created_can_dispatch.assert_not_called()
+        state_can_dispatch.assert_not_called()
+        assert_equal(called_receivers, ['receiver', 'property'])
+
+        called_receivers.clear()
+        signal.disconnect(created_dispatcher, sender=TestDispatchersModel)
+        signal.send(sender=TestDispatchersModel, instance=instance, changed=False, changed_fields={})
+        assert_equal(called_receivers, ['receiver', 'property'])
+
+    def test_created_dispatcher_should_be_called_for_every_object_in_smart_bulk_create(self):
+        TestDispatchersModel.objects.smart_bulk_create([TestDispatchersModel() for _ in range(3)])
+        assert_equal(TestDispatchersModel.objects.count(), 3)
+        assert_equal(CSVRecord.objects.count(), 3)
+        assert_equal(TestFieldsModel.objects.count(), 3)
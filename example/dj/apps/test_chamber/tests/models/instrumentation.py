@@ -0,0 +1,46 @@
+from django.test import TransactionTestCase
+
+from chamber.models.instrumentation import SaveProfiler
+
+from germanium.tools import assert_equal, assert_in, assert_true  # pylint: disable=E0401
+
+from test_chamber.models import TestDispatchersModel
+
+
+__all__ = (
+    'SaveProfilerTestCase',
+)
+
+
+class SaveProfilerTestCase(TransactionTestCase):
+
+    def test_save_profiler_should_record_save_stages(self):
+        exported_stats = []
+        with SaveProfiler(sink=exported_stats.append) as profiler:
+            obj = TestDispatchersModel.objects.create()
+            obj.change_and_save(state=TestDispatchersModel.STATE.SECOND)
+
+        stats = {
+            (stats['stage'], stats['detail']): stats for stats in profiler.get_stats()
+            if stats['model'] == 'test_chamber.TestDispatchersModel'
+        }
+        assert_equal(exported_stats, [profiler.get_stats()])
+        assert_equal(stats[('save', None)]['count'], 2)
+        assert_equal(stats[('save_simple', None)]['query_count'], 2)
+        assert_equal(stats[('clean_pre_save', None)]['count'], 2)
+        assert_equal(
+            stats[('dispatch_pre_save', 'CreatedDispatcher(create_csv_record_handler)')]['query_count'], 1
+        )
+        # State field is changed by the create and the update, but the handler is called only by the update
+        assert_equal(
+            stats[('dispatch_pre_save', 'StateDispatcher(create_test_smart_model_handler)')]['count'], 2
+        )
+        assert_equal(
+            stats[('dispatch_pre_save', 'StateDispatcher(create_test_smart_model_handler)')]['query_count'], 1
+        )
+        assert_true(any(stats['model'] == 'test_chamber.TestSmartModel' for stats in profiler.get_stats()))
+        assert_in('dispatch_post_save', profiler.format_report())
+
+        # Saves outside of the profiler are not recorded
+        obj.change_and_save(state=TestDispatchersModel.STATE.FIRST)
+        assert_equal(profiler.get_stats(), exported_stats[0])
@@ -1,14 +1,17 @@
 from datetime import date, datetime
+from unittest.mock import patch
 
 from django.core.exceptions import FieldError, MultipleObjectsReturned
+from django.db import transaction
 from django.http.response import Http404
 from django.test import TestCase
 from django.utils import timezone
 
 from chamber.shortcuts import (
     bulk_change, bulk_change_and_save, bulk_save, change, change_and_save, distinct_field,
-    exclude_by_date, filter_by_date, get_object_or_404, get_object_or_none
+    exclude_by_date, filter_by_date, get_object_or_404, get_object_or_none, stream_change_and_save, stream_save
 )
+from chamber.exceptions import PersistenceException
 
 from germanium.tools import assert_equal, assert_is_none, assert_raises  # pylint: disable=E0401
 
@@ -121,3 +124,80 @@ class ShortcutsTestCase(TestCase):
         obj2.refresh_from_db()
         assert_equal(obj1.name, 'modified')
         assert_equal(obj2.name, 'modified')
+
+    def test_bulk_change_and_save_in_bulk_mode(self):
+        obj1 = ShortcutsModel.objects.create(name='test1', datetime=timezone.now(), number=1)
+        obj2 = ShortcutsModel.objects.create(name='test2', datetime=timezone.now(), number=2)
+        obj3 = ShortcutsModel(name='test3', datetime=timezone.now(), number=3)
+        with self.assertNumQueries(2):
+            assert_equal(bulk_change_and_save([obj1, obj2, obj3], name='modified', bulk=True), [obj1, obj2, obj3])
+        assert_equal(list(ShortcutsModel.objects.values_list('name', flat=True)), ['modified'] * 3)
+        assert_equal(list(ShortcutsModel.objects.values_list('number', flat=True)), [1, 2, 3])
+
+    def test_bulk_change_and_save_in_bulk_mode_should_accept_update_only_changed_fields_in_save_kwargs(self):
+        obj1 = DiffModel.objects.create(name='test1', datetime=timezone.now(), number=1)
+        obj2 = DiffModel.objects.create(name='test2', datetime=timezone.now(), number=2)
+        DiffModel.objects.update(number=10)
+
+        bulk_change_and_save(
+            [obj1, obj2], bulk=True, save_kwargs={'update_only_changed_fields': True}, name='modified'
+        )
+        assert_equal(list(DiffModel.objects.order_by('pk').values_list('name', 'number')), [('modified', 10)] * 2)
+
+    def test_bulk_change_and_save_in_bulk_mode_should_update_auto_now_fields_of_changed_fields(self):
+        obj1 = ShortcutsModel.objects.create(name='test1', datetime=timezone.make_aware(datetime(2020, 1, 1)), number=1)
+        obj2 = ShortcutsModel.objects.create(name='test2', datetime=timezone.make_aware(datetime(2020, 1, 1)), number=2)
+        ShortcutsModel.objects.update(number=10)
+
+        with patch.object(ShortcutsModel._meta.get_field('datetime'), 'auto_now', True):
+            bulk_change_and_save([obj1, obj2], update_only_changed_fields=True, bulk=True, name='modified')
+        for obj in ShortcutsModel.objects.all():
+            assert_equal((obj.name, obj.number), ('modified', 10))
+            assert_equal(obj.datetime.date(), timezone.now().date())
+
+    def test_stream_change_and_save(self):
+        for i in range(5):
+            DiffModel.objects.create(name='test', datetime=timezone.now(), number=i)
+
+        with patch('chamber.shortcuts.transaction.atomic', wraps=transaction.atomic) as atomic:
+            result = stream_change_and_save(DiffModel.objects.all(), chunk_size=2, name='modified')
+        assert_equal(atomic.call_count, 3)
+        assert_equal(result, (5, 0, []))
+        assert_equal(list(DiffModel.objects.values_list('name', flat=True)), ['modified'] * 5)
+
+        result = stream_change_and_save(DiffModel.objects.all(), chunk_size=2, bulk=True, name='modified2')
+        assert_equal(result.saved_count, 5)
+        assert_equal(list(DiffModel.objects.values_list('name', flat=True)), ['modified2'] * 5)
+
+    def test_stream_save_should_return_failed_pks(self):
+        objs = [DiffModel.objects.create(name='test', datetime=timezone.now(), number=i) for i in range(3)]
+        objs[1].name = 'x' * 101
+        for obj in objs:
+            obj.number += 10
+
+        with assert_raises(PersistenceException):
+            stream_save(objs, chunk_size=2)
+        assert_equal(list(DiffModel.objects.values_list('number', flat=True)), [0, 1, 2])
+
+        result = stream_save(objs, chunk_size=2, ignore_errors=(PersistenceException,))
+        assert_equal(result, (2, 1, [objs[1].pk]))
+        assert_equal(list(DiffModel.objects.values_list('number', flat=True)), [10, 1, 12])
+
+    def test_queryset_change_and_save_in_bulk_mode(self):
+        obj1 = DiffModel.objects.create(name='test', datetime=timezone.now(), number=1)
+        obj2 = DiffModel.objects.create(name='test', datetime=timezone.now(), number=2)
+
+        # Uniform values are updated with one UPDATE query
+        with self.assertNumQueries(1 + 3):  # SELECT, SAVEPOINT, UPDATE, RELEASE
+            DiffModel.objects.all().change_and_save(name='modified', update_only_changed_fields=True, bulk=True)
+        obj1.refresh_from_db()
+        obj2.refresh_from_db()
+        assert_equal((obj1.name, obj1.number), ('modified', 1))
+        assert_equal((obj2.name, obj2.number), ('modified', 2))
+
+        # Different values are updated with Django bulk_update
+        DiffModel.objects.all().change_and_save(name='modified2', bulk=True)
+        obj1.refresh_from_db()
+        obj2.refresh_from_db()
+        assert_equal((obj1.name, obj1.number), ('modified2', 1))
+        assert_equal((obj2.name, obj2.number), ('modified2', 2))
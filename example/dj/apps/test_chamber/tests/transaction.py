@@ -3,7 +3,11 @@ from django.db import transaction
 
 from django.db.transaction import on_commit
 
-from chamber.utils.transaction import UniquePreCommitCallable, in_atomic_block, pre_commit, smart_atomic
+from chamber.models.handlers import BatchPreCommitHandler, InstanceOneTimePreCommitHandler
+from chamber.utils.executors import LocalQueueExecutor
+from chamber.utils.transaction import (
+    BatchPreCommitCallable, UniquePreCommitCallable, in_atomic_block, pre_commit, smart_atomic
+)
 
 from test_chamber.models import TestSmartModel
 
@@ -110,6 +114,155 @@ class TransactionsTestCase(TransactionTestCase):
 
         assert_equal(numbers_list, [1])
 
+    def test_pre_commit_should_add_one_time_callable_again_after_savepoint_rollback(self):
+        numbers_list = []
+
+        class AddNumberOneTimePreCommitCallable(UniquePreCommitCallable):
+
+            def handle(self):
+                self.kwargs_list[-1]['numbers_list'].append(self.kwargs_list[-1]['number'])
+
+        with transaction.atomic():
+            with transaction.atomic():
+                pre_commit(lambda: add_number(numbers_list, 0))
+            with assert_raises(RuntimeError):
+                with transaction.atomic():
+                    pre_commit(AddNumberOneTimePreCommitCallable(numbers_list=numbers_list, number=1))
+                    raise RuntimeError
+            pre_commit(AddNumberOneTimePreCommitCallable(numbers_list=numbers_list, number=2))
+            pre_commit(AddNumberOneTimePreCommitCallable(numbers_list=numbers_list, number=3))
+
+        assert_equal(numbers_list, [0, 2])
+
+    def test_pre_commit_should_call_not_unique_batch_callables_together(self):
+        numbers_batches = []
+
+        class AddNumberBatchPreCommitCallable(BatchPreCommitCallable):
+
+            def __init__(self, number):
+                self.number = number
+
+            def get_batch_key(self):
+                return 'add_number'
+
+            @classmethod
+            def call_batch(cls, callables):
+                numbers_batches.append([callable.number for callable in callables])
+
+        with transaction.atomic():
+            pre_commit(AddNumberBatchPreCommitCallable(1))
+            pre_commit(lambda: numbers_batches.append([0]))
+            pre_commit(AddNumberBatchPreCommitCallable(1))
+            with assert_raises(RuntimeError):
+                with transaction.atomic():
+                    pre_commit(AddNumberBatchPreCommitCallable(2))
+                    raise RuntimeError
+            pre_commit(AddNumberBatchPreCommitCallable(3))
+
+        assert_equal(numbers_batches, [[1, 1, 3], [0]])
+
+    def test_instance_one_time_pre_commit_handler_should_handle_instances_in_batch(self):
+        handled_batches = []
+
+        class BatchHandler(InstanceOneTimePreCommitHandler):
+
+            is_batch = True
+            batch_size = 2
+
+            def handle_batch(self, instances):
+                handled_batches.append([instance.name for instance in instances])
+
+        handler = BatchHandler()
+        objs = [TestSmartModel.objects.create(name=str(i)) for i in range(5)]
+        with transaction.atomic():
+            for obj in objs:
+                obj.change_and_save(name=f'{obj.name}_changed')
+                handler(obj)
+                handler(obj)
+            with assert_raises(RuntimeError):
+                with transaction.atomic():
+                    handler(TestSmartModel.objects.create(name='rollbacked'))
+                    raise RuntimeError
+            objs[4].delete()
+
+            # 2 in_bulk queries (batch size is 2)
+            with self.assertNumQueries(2):
+                transaction.get_connection().run_pre_commit.popleft()()
+            assert_equal(handled_batches, [['0_changed', '1_changed', '2_changed', '3_changed']])
+
+    def test_batch_pre_commit_handler_should_handle_instances_together_before_commit(self):
+        handled_batches = []
+
+        class TestBatchHandler(BatchPreCommitHandler):
+
+            batch_size = 2
+
+            def handle_batch(self, instances, kwargs_list):
+                handled_batches.append(
+                    [(instance.name, kwargs['changed_fields']) for instance, kwargs in zip(instances, kwargs_list)]
+                )
+
+        handler = TestBatchHandler()
+        with transaction.atomic():
+            for i in range(3):
+                handler(TestSmartModel.objects.create(name=str(i)), changed_fields=['name'])
+            with assert_raises(RuntimeError):
+                with transaction.atomic():
+                    handler(TestSmartModel.objects.create(name='rollbacked'), changed_fields=['name'])
+                    raise RuntimeError
+            assert_equal(handled_batches, [])
+        assert_equal(handled_batches, [[('0', ['name']), ('1', ['name'])], [('2', ['name'])]])
+
+        handled_batches = []
+        handler = TestBatchHandler(flush_on_size=True)
+        with transaction.atomic():
+            for i in range(3):
+                handler(TestSmartModel.objects.create(name=str(i)), changed_fields=['name'])
+            assert_equal(handled_batches, [[('0', ['name']), ('1', ['name'])]])
+        assert_equal(handled_batches, [[('0', ['name']), ('1', ['name'])], [('2', ['name'])]])
+
+        handled_batches = []
+        with transaction.atomic():
+            with assert_raises(RuntimeError):
+                with transaction.atomic():
+                    for i in range(3):
+                        handler(TestSmartModel.objects.create(name='rollbacked'), changed_fields=['name'])
+                    raise RuntimeError
+            with transaction.atomic():
+                for i in range(2):
+                    handler(TestSmartModel.objects.create(name=str(i)), changed_fields=['name'])
+            assert_equal(handled_batches, [])
+            handler(TestSmartModel.objects.create(name='2'), changed_fields=['name'])
+            assert_equal(handled_batches, [[('0', ['name']), ('1', ['name'])], [('2', ['name'])]])
+        assert_equal(handled_batches, [[('0', ['name']), ('1', ['name'])], [('2', ['name'])]])
+
+        handled_batches = []
+        handler(TestSmartModel.objects.create(name='3'), changed_fields=['name'])
+        assert_equal(handled_batches, [[('3', ['name'])]])
+
+    def test_pre_commit_handler_with_executor_should_submit_handler_after_commit(self):
+        handled_names = []
+
+        class TestHandler(InstanceOneTimePreCommitHandler):
+
+            def handle(self, instance, **kwargs):
+                handled_names.append(instance.name)
+
+        executor = LocalQueueExecutor()
+        handler = TestHandler(executor=executor)
+        obj = TestSmartModel.objects.create(name='test')
+        with transaction.atomic():
+            handler(obj)
+            obj.change_and_save(name='changed')
+            handler(obj)
+            assert_equal(len(executor.queue), 0)
+        assert_equal(len(executor.queue), 1)
+        assert_equal(handled_names, [])
+
+        executor.run_pending()
+        assert_equal(handled_names, ['changed'])
+        assert_equal(executor.metrics.completed, 1)
+
     def test_pre_commit_should_called_with_the_right_order(self):
         data = []
 
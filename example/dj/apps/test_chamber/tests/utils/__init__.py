@@ -14,6 +14,8 @@ from germanium.tools import assert_equal, assert_true  # pylint: disable=E0401
 
 from .datastructures import *  # NOQA
 from .decorators import *  # NOQA
+from .executors import *  # NOQA
+from .field_registry import *  # NOQA
 
 
 class TestClass(object):
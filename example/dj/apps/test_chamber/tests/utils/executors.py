@@ -0,0 +1,50 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import TestCase
+
+from chamber.utils.executors import ExecutorQueueFull, LocalQueueExecutor, PoolExecutor
+
+from germanium.tools import assert_equal, assert_raises  # pylint: disable=E0401
+
+
+__all__ = (
+    'ExecutorsTestCase',
+)
+
+
+class ExecutorsTestCase(TestCase):
+
+    def test_local_queue_executor_should_run_jobs_and_count_metrics(self):
+        data = []
+        executor = LocalQueueExecutor(max_queue_size=2)
+        executor.submit(lambda: data.append(1))
+        executor.submit(lambda: 1 / 0)
+        with assert_raises(ExecutorQueueFull):
+            executor.submit(lambda: data.append(3))
+        assert_equal(executor.metrics.as_dict(), {
+            'submitted': 2, 'completed': 0, 'failed': 0, 'rejected': 1, 'pending': 2
+        })
+
+        with self.assertLogs('chamber.utils.executors', level='ERROR') as logs:
+            executor.run_pending()
+        assert_equal(data, [1])
+        assert_equal(len(logs.records), 1)
+        assert_equal(logs.records[0].getMessage(), 'Executor job failed')
+        assert_equal(logs.records[0].exc_info[0], ZeroDivisionError)
+        assert_equal(executor.metrics.as_dict(), {
+            'submitted': 2, 'completed': 1, 'failed': 1, 'rejected': 1, 'pending': 0
+        })
+
+    def test_pool_executor_should_apply_backpressure(self):
+        event = threading.Event()
+        executor = PoolExecutor(ThreadPoolExecutor(max_workers=1), max_queue_size=1, timeout=0.01)
+        executor.submit(event.wait)
+        with assert_raises(ExecutorQueueFull):
+            executor.submit(event.wait)
+        event.set()
+        executor.shutdown()
+        assert_equal(executor.metrics.as_dict(), {
+            'submitted': 1, 'completed': 1, 'failed': 0, 'rejected': 1, 'pending': 0
+        })
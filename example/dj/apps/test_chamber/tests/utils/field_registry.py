@@ -0,0 +1,47 @@
+from django.apps import apps
+from django.test import TestCase
+
+from chamber.models.changed_fields import get_model_field_names, get_model_fields
+from chamber.utils.field_registry import get_field_registry
+
+from germanium.tools import assert_equal, assert_not_equal, assert_true  # pylint: disable=E0401
+
+from test_chamber.models import RelatedSmartModel, TestSmartModel  # pylint: disable=E0401
+
+
+__all__ = (
+    'FieldRegistryTestCase',
+)
+
+
+class FieldRegistryTestCase(TestCase):
+
+    def test_field_registry_should_contain_model_field_indexes(self):
+        field_registry = get_field_registry(RelatedSmartModel)
+
+        assert_equal(field_registry.pk_name, 'id')
+        assert_equal(field_registry.concrete_field_names, ('id', 'test_smart_model'))
+        assert_equal(field_registry.concrete_attnames, ('id', 'test_smart_model_id'))
+        assert_equal(field_registry.field_names_by_attname['test_smart_model_id'], 'test_smart_model')
+        assert_equal(field_registry.auto_now_field_names, ())
+        assert_true({'pk', 'test_smart_model', 'test_smart_model_id'} <= field_registry.settable_field_names)
+
+    def test_field_registry_should_be_cached_per_model_and_invalidated_with_app_registry_cache(self):
+        field_registry = get_field_registry(TestSmartModel)
+
+        assert_true(get_field_registry(TestSmartModel) is field_registry)
+        assert_true(get_field_registry(TestSmartModel(name='test')) is field_registry)
+        assert_not_equal(get_field_registry(RelatedSmartModel), field_registry)
+
+        apps.clear_cache()
+        assert_true(get_field_registry(TestSmartModel) is not field_registry)
+
+    def test_model_field_helpers_should_return_lists_independent_on_field_registry(self):
+        field_names = get_model_field_names(RelatedSmartModel)
+        assert_equal(field_names, ['id', 'test_smart_model'])
+        field_names.append('name')
+        assert_equal(get_field_registry(RelatedSmartModel).concrete_field_names, ('id', 'test_smart_model'))
+        assert_equal(
+            get_model_fields(RelatedSmartModel),
+            [RelatedSmartModel._meta.get_field('id'), RelatedSmartModel._meta.get_field('test_smart_model')]
+        )